@@ -1,12 +1,13 @@
 from io import StringIO
+import asyncio
 import json
 import os
-from typing import Dict, Literal, Optional
+from typing import Dict, Literal, Optional, Tuple
 import pandas as pd
 import sqlite3
 
 # LangChain imports
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_core.prompts import PromptTemplate
 from langgraph.graph import StateGraph, END, START
 from langgraph.types import Command
@@ -20,8 +21,16 @@ import chainlit.data as cl_data
 from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
 
 # Local imports
-from src.utils.utils import token_count, read_prompt, read_file_prompt, messages_token_count, load_chat_model, get_latest_human_message, reasoning_prompt, trim_messages_to_max_tokens
-from src.db.db_query import generate_query, is_valid_query, query_summary
+from src.utils.utils import token_count, messages_token_count, load_chat_model, get_latest_human_message, trim_messages_to_max_tokens
+from src.utils.prompts import prompt_registry
+from src.db.db_query import generate_query, is_valid_query, query_schema_version
+from src.db.query_cache import QueryCache
+from src.db.result_cache import QueryResultCache
+from src.db.result_shaping import shape_query, shape_rows
+from src.core.intent_classifier import IntentClassifier
+from src.core import report
+from src.db.report_cache import ReportCache
+from src.db.checkpointer import SQLiteCheckpointer
 
 # Custom API
 from fastapi import FastAPI, HTTPException, Request, Response, APIRouter
@@ -29,14 +38,12 @@ from starlette.responses import StreamingResponse
 from chainlit.server import app
 from starlette.routing import BaseRoute, Route
 
-checkpointer=MemorySaver()
-
 #-------------------------------
 # System Constants
 #-------------------------------
-SYSTEM_PROMPT = read_file_prompt("./src/prompts/report_system_prompt.txt")
 
 VALID_REPORT_CATEGORIES = {"code", "container", "aws", "kubernetes", "all"}
+REFRESH_FLAG = "--refresh"
 
 #-------------------------------
 # Database Configuration
@@ -44,10 +51,20 @@ VALID_REPORT_CATEGORIES = {"code", "container", "aws", "kubernetes", "all"}
 from src.db.db_setup import setup_database_connections
 
 app_context = setup_database_connections()
+try:
+    checkpointer = SQLiteCheckpointer(database_path=app_context.db_path)
+except sqlite3.Error as e:
+    print(f"Persistent checkpointer unavailable, keeping conversation state in memory: {e}")
+    checkpointer = MemorySaver()
+query_cache = QueryCache(query_schema_version(), database_path=app_context.db_path)
+result_cache = QueryResultCache()
+app_context.on_data_change(result_cache.clear)
+report_cache = ReportCache(database_path=app_context.db_path)
 #-------------------------------
 # Model setup
 #-------------------------------
 model = load_chat_model()
+intent_classifier = IntentClassifier()
 final_model = load_chat_model().with_config(tags=["final_node"])
 
 #-------------------------------
@@ -70,6 +87,13 @@ class AgentState(MessagesState):
     category: Optional[str] = None
     result_text: Optional[str] = None
     top5: Optional[str] = None
+    summary_text: Optional[str] = None
+    summary_message: Optional[AIMessage] = None
+    insight_message: Optional[AIMessage] = None
+    refresh_report: bool = False
+    report_generation: Optional[int] = None
+    report_cache_hit: Optional[dict] = None
+    query_dataframe: Optional[str] = None
     dataframe: Optional[str] = None
 
 
@@ -78,9 +102,9 @@ class AgentState(MessagesState):
 #-------------------------------
 # Helper Functions
 #-------------------------------
-def parse_report_command(input_string: str) -> str:
+def parse_report_command(input_string: str) -> Tuple[str, bool]:
     """
-    Parse a /report command and extract the category.
+    Parse a /report command and extract the category and the --refresh flag.
     Raises ValueError for invalid input.
     """
     command_prefix = "/report "
@@ -90,6 +114,10 @@ def parse_report_command(input_string: str) -> str:
         
     # Extract the argument after the prefix
     argument = input_string[len(command_prefix):].strip()
+    refresh = False
+    if argument.endswith(REFRESH_FLAG):
+        refresh = True
+        argument = argument[:-len(REFRESH_FLAG)].strip()
     
     if not argument:
         raise ValueError("No argument provided after '/report'.")
@@ -100,7 +128,82 @@ def parse_report_command(input_string: str) -> str:
             f"{', '.join(VALID_REPORT_CATEGORIES)}."
         )
         
-    return argument
+    return argument, refresh
+
+STREAM_STOP = object()
+
+class OrderedNodeStream:
+    """
+    Replay streamed output of concurrently running nodes in a fixed node order.
+
+    Events of the node whose turn it is pass straight through; events of later nodes are
+    buffered until every node before them has sent STREAM_STOP. Nodes outside the order
+    are never buffered.
+    """
+
+    def __init__(self, order: list):
+        self.order = list(order)
+        self.position = 0
+        self.pending = {node: [] for node in self.order}
+
+    def push(self, node: str, event) -> list:
+        """Queue an event and return the (node, event) pairs that can be emitted now."""
+        if node not in self.pending:
+            return [(node, event)]
+        self.pending[node].append(event)
+        ready = []
+        while self.position < len(self.order):
+            current = self.order[self.position]
+            events, self.pending[current] = self.pending[current], []
+            ready.extend((current, e) for e in events)
+            if STREAM_STOP not in events:
+                break
+            self.position += 1
+        return ready
+
+    def flush(self) -> list:
+        """Return everything still buffered, e.g. when a node failed before finishing."""
+        ready = []
+        for node in self.order[self.position:]:
+            ready.extend((node, e) for e in self.pending[node])
+            self.pending[node] = []
+        self.position = len(self.order)
+        return ready
+
+async def ordered_stream_events(stream):
+    """
+    Turn a graph stream of ("messages", "updates") chunks into the (node, event) pairs shown
+    in the chat, in REPORT_STREAM_ORDER for the report nodes. An event is a text chunk of a
+    reasoning node, or STREAM_STOP once that node's update arrived, i.e. the node finished,
+    whatever finish_reason its model reported.
+    """
+    ordered = OrderedNodeStream(REPORT_STREAM_ORDER)
+    async for mode, chunk in stream:
+        events = []
+        if mode == "messages":
+            msg, metadata = chunk
+            node = metadata["langgraph_node"]
+            if node == "cached_report" and msg.name:
+                node = msg.name
+            if (
+                msg.content
+                and not isinstance(msg, HumanMessage)
+                and not isinstance(msg, SystemMessage)
+                and node in REASONING_NODE
+            ):
+                events.append((node, msg.content))
+                # A replayed report message is complete, the cached_report update covers all of them
+                if metadata["langgraph_node"] == "cached_report":
+                    events.append((node, STREAM_STOP))
+        elif mode == "updates":
+            events.extend((node, STREAM_STOP) for node in chunk if node in REASONING_NODE)
+
+        for node, event in events:
+            for ready in ordered.push(node, event):
+                yield ready
+
+    for ready in ordered.flush():
+        yield ready
 
 #-------------------------------
 # Node Functions
@@ -115,38 +218,40 @@ async def classify_user_intent(state: AgentState):
     
     try:
         # Try to parse as a report command
-        category = parse_report_command(query)
+        category, refresh = parse_report_command(query)
         return Command(
-            update={"category": category},
-            goto="summary"
+            update={"category": category, "refresh_report": refresh, "query_dataframe": None},
+            goto="report_data"
         )
     except ValueError:
-        # Process as a regular question
-        content = reasoning_prompt(
-            "./src/prompts/intent_classification_prompt.txt", 
-            question=query
-        )
-        intent_response = await model.ainvoke([HumanMessage(content=content)])
+        # Process as a regular question, using the local classifier when it is confident
+        res = intent_classifier.classify(query)
         
         try:
-            res = json.loads(intent_response.content)
+            if res is None:
+                content = prompt_registry.format("intent_classification_prompt", question=query)
+                intent_response = await model.ainvoke([HumanMessage(content=content)])
+                intent_classifier.record_llm()
+                res = json.loads(intent_response.content)
+                res["Source"] = "llm"
+            print(f"Intent: {res} {intent_classifier.saved_llm_calls()}")
             score = res.get("Score", 0)
             
             if score > 30:
                 return Command(
-                    update={"intention": res, "user_query": query},
+                    update={"intention": res, "user_query": query, "query_dataframe": None},
                     goto="querydb"
                 )
             else:
                 return Command(
-                    update={"intention": res, "user_query": None},
+                    update={"intention": res, "user_query": None, "query_dataframe": None},
                     goto="reason"
                 )
         except json.JSONDecodeError:
             # Handle invalid JSON response
             print("Failed to parse intent classification response")
             return Command(
-                update={"user_query": query},
+                update={"user_query": query, "query_dataframe": None},
                 goto="reason"
             )
         
@@ -156,86 +261,71 @@ async def invoke_llm(state: AgentState):
     # We return a list, because this will get added to the existing list
     return {"messages": [response]}
 
+async def load_report_data(state: AgentState):
+    """Query the summary and top findings once for the summary and insight nodes"""
+    print("--------------do_report_data---------------")
+    category = state["category"]
+    generation = app_context.check_data_version()
+
+    # Query database for summary data on the database executor
+    data = await app_context.run_read(report.report_data_sync, category)
+
+    cached = None
+    if not state.get("refresh_report"):
+        cached = await asyncio.to_thread(report_cache.get, category, generation, report.report_version())
+
+    # Store results in state
+    return {**data, "report_generation": generation, "report_cache_hit": cached}
+
+def route_report(state: AgentState):
+    """Serve a pre-generated report when there is one for the current data, otherwise generate it"""
+    if state.get("report_cache_hit"):
+        return "cached_report"
+    return ["summary", "insight"]
+
+async def serve_cached_report(state: AgentState):
+    """Replay a pre-generated report as if the report nodes had just produced it"""
+    print("--------------do_cached_report---------------")
+    cached = state["report_cache_hit"]
+    # Named after the node that would have generated them, so on_message renders them the same way
+    summary = AIMessage(content=cached["summary"], name="summary")
+    insight = AIMessage(content=cached["insight"], name="insight")
+    conclusion = AIMessage(content=cached["conclusion"], name="conclude")
+    return {"messages": [summary, insight, HumanMessage(content=cached["result_text"]), conclusion]}
+
 async def generate_summary_report(state: AgentState):
     """Generate a summary report based on the specified category"""
     print("--------------do_summary---------------")
-    category = state["category"]
-
-    # Query database for summary data
-    summary_df, details_df = await query_summary(app_context.get_connection(), category)
-    
-    # Convert results to string format
-    result = details_df.to_string(index=False)
-    top5_result = details_df.to_string()
-    summary = summary_df.to_string(index=False)
-
-    # Format prompt for the model
-    template = read_prompt("summary")
-    prompt = PromptTemplate(
-        template=template,
-        input_variables=["category", "summary", "result"]
-    )
-    formatted_prompt = prompt.format(
-        category=category, 
-        summary=summary, 
-        result=result
-    )
-    
-    # Create messages for the model
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=formatted_prompt)
-    ]
+    messages = report.summary_messages(state["category"], state["summary_text"], state["result_text"])
 
     # Log token usage
-    tokens = token_count(formatted_prompt)
+    tokens = token_count(messages[-1].content)
     print(f"Token used: {tokens}\n")
 
     # Get response from the model
     response = await final_model.ainvoke(messages)
 
-    # Store results in state
-    df_str = details_df.to_csv(index=False)
-    return {
-        "dataframe": df_str, 
-        "result_text": result, 
-        "top5": top5_result, 
-        "messages": [response]
-    }
+    # Added to the history by conclude, so the order does not depend on which call ends first
+    return {"summary_message": response}
 
 async def generate_insights(state: AgentState):
     """Generate insights based on the top 5 results"""
     print("--------------do_insight---------------")
-    result = state["top5"]
-
-    # Format prompt for insights
-    template = read_prompt("insight")
-    prompt = PromptTemplate(
-        template=template,
-        input_variables=["result"]
-    )
-    formatted_prompt = prompt.format(result=result)
-    
-    # Create messages for the model
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=formatted_prompt)
-    ]
+    messages = report.insight_messages(state["top5"])
     
     # Get response from the model
     response = await final_model.ainvoke(messages)
 
-    return {"messages": [response]}
+    return {"insight_message": response}
 
 async def finalize_conclusion(state: AgentState):
     """Generate a conclusion based on the full results"""
     print("--------------do_conclude---------------")
-    messages = state["messages"]
+    report_messages = [state["summary_message"], state["insight_message"]]
     result = state["result_text"]
 
     # Add conclusion prompt to messages
-    template = read_prompt("conclude")
-    messages.append(HumanMessage(content=template))
+    messages = report.conclusion_messages(state["messages"] + report_messages)
     
     # Log token usage
     total_tokens = messages_token_count(messages)
@@ -243,8 +333,13 @@ async def finalize_conclusion(state: AgentState):
     
     # Get response from the model
     response = await final_model.ainvoke(messages)
+
+    # Later /report requests for this category are served from the cache until data changes
+    content = report.report_content(state, report_messages[0].content, report_messages[1].content, response.content)
+    if app_context.data_settled(state["report_generation"]):
+        await asyncio.to_thread(report_cache.put, state["category"], state["report_generation"], report.report_version(), content)
     
-    return {"messages": [HumanMessage(content=result), response]}
+    return {"messages": report_messages + [HumanMessage(content=result), response]}
 
 async def execute_db_query(state: AgentState) -> Command[Literal["reason"]]:
     """
@@ -255,14 +350,23 @@ async def execute_db_query(state: AgentState) -> Command[Literal["reason"]]:
     
     # Determine category if available
     category = state.get("category", "ALL").upper() if state.get("category") else "ALL"
+    cached_query = None
 
     try:
-        # Generate a database query using the model
-        generated_query = await generate_query(user_query, category, model)
+        # Reuse SQL generated for the same or a near-identical question
+        cached_query = await query_cache.get(user_query, category)
+        if cached_query:
+            print(f"Using cached SQL query. Cache stats: {query_cache.stats()}\n\n")
+            generated_query = cached_query
+        else:
+            # Generate a database query using the model
+            generated_query = await generate_query(user_query, category, model)
 
         # Validate the generated query
         if not is_valid_query(generated_query, app_context.get_engine()):
             print("Generated query is invalid or potentially unsafe.\n\n")
+            if cached_query:
+                await query_cache.evict(category, cached_query)
             return Command(
                 update={"user_query": user_query},
                 goto="reason"
@@ -270,16 +374,25 @@ async def execute_db_query(state: AgentState) -> Command[Literal["reason"]]:
 
         # Execute the validated query
         print("Executing query...\n\n")
-        cursor = app_context.get_connection().cursor()
-        cursor.execute(generated_query)
-        records = cursor.fetchall()
+        generation = app_context.check_data_version()
+        cached_result = result_cache.get(generated_query, generation)
+        if cached_result is not None:
+            columns, records = cached_result
+            shaped = await asyncio.to_thread(shape_rows, columns, records)
+            print(f"Using cached query results. Cache stats: {result_cache.stats()}\n\n")
+        else:
+            # Rows are aggregated as they are fetched; only a token budgeted sample reaches the prompt
+            shaped = await app_context.run_read(shape_query, generated_query)
+            # Results read while an import is writing are not cached under the old generation
+            if not shaped.truncated and app_context.data_settled(generation):
+                result_cache.put(generated_query, generation, shaped.columns, shaped.rows)
+
+        if not cached_query:
+            await query_cache.put(user_query, category, generated_query)
 
         # Prepare query results
-        if records:
-            columns = [desc[0] for desc in cursor.description]
-            results_str = "\n".join(str(dict(zip(columns, row))) for row in records)
-        else:
-            results_str = "No results returned."
+        results_str = shaped.to_prompt()
+        query_dataframe = await asyncio.to_thread(shaped.to_csv)
 
         print("Query results prepared.\n\n")
         return Command(
@@ -287,6 +400,7 @@ async def execute_db_query(state: AgentState) -> Command[Literal["reason"]]:
                 "user_query": user_query, 
                 "sql_query": generated_query, 
                 "query_results": results_str, 
+                "query_dataframe": query_dataframe,
                 "messages": messages + [SystemMessage(content="Query executed successfully.")]
             },
             goto="reason"
@@ -294,6 +408,8 @@ async def execute_db_query(state: AgentState) -> Command[Literal["reason"]]:
 
     except Exception as e:
         print(f"Error during query execution: {e}\n\n")
+        if cached_query:
+            await query_cache.evict(category, cached_query)
         return Command(
             update={"user_query": user_query},
             goto="reason"
@@ -314,20 +430,12 @@ async def provide_explanation(state: AgentState):
             user_query = get_latest_human_message(state["messages"])
 
         # Format the explanation prompt
-        template = read_prompt("explanation")
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["question", "sql_query", "scan_results"]
-        )
-        formatted_prompt = prompt.format(
+        formatted_prompt = prompt_registry.format(
+            "explanation_prompt",
             question=user_query, 
             sql_query=sql_query, 
             scan_results=query_results
         )
-        
-        # Limit prompt size to prevent token overflow
-        if len(formatted_prompt) > 80000:
-            formatted_prompt = formatted_prompt[:80000]
 
         messages.append(HumanMessage(content=formatted_prompt))
         messages = trim_messages_to_max_tokens(messages)
@@ -366,6 +474,8 @@ builder = StateGraph(AgentState)
 
 builder.add_node("intent", classify_user_intent)
 builder.add_node("querydb", execute_db_query)
+builder.add_node("report_data", load_report_data)
+builder.add_node("cached_report", serve_cached_report)
 builder.add_node("summary", generate_summary_report)
 builder.add_node("insight", generate_insights)
 builder.add_node("conclude", finalize_conclusion)
@@ -374,12 +484,16 @@ builder.add_node("report", invoke_llm)
 
 # define the node which will display the resoning result on web
 REASONING_NODE = ["reason", "report", "summary", "insight", "assessment", "remediation", "effort", "conclude"]
+# summary and insight stream concurrently, but are shown one after the other
+REPORT_STREAM_ORDER = ["summary", "insight"]
 
 builder.add_edge(START, "intent")
-builder.add_edge("summary", "insight")
-builder.add_edge("insight", "conclude")
+# summary and insight only depend on report_data, so both LLM calls run concurrently
+builder.add_conditional_edges("report_data", route_report, ["cached_report", "summary", "insight"])
+builder.add_edge(["summary", "insight"], "conclude")
 builder.add_edge("querydb", "reason")
 builder.add_edge("conclude", END)
+builder.add_edge("cached_report", END)
 builder.add_edge("reason", END)
 
 graph = builder.compile(
@@ -403,35 +517,33 @@ async def on_message(msg: cl.Message):
     cb = cl.LangchainCallbackHandler()
     final_answer = cl.Message(content="")
     
-    async for msg, metadata in graph.astream({"messages": [HumanMessage(content=msg.content)]}, stream_mode="messages", config=RunnableConfig(callbacks=[], **config)):
-        if (
-            msg.content
-            and not isinstance(msg, HumanMessage)
-            and not isinstance(msg, SystemMessage)
-            and metadata["langgraph_node"] in REASONING_NODE
-        ):
-            await final_answer.stream_token(msg.content)
-
-        if (
-            "finish_reason" in msg.response_metadata
-            and msg.response_metadata["finish_reason"] == "stop"
-        ):
+    async def emit(node, event):
+        if event == STREAM_STOP:
             await final_answer.stream_token("\n\n")
+            # Hack print report by dataframe
+            if node in ["insight"]:
+                state = graph.get_state(config=config)
+                df_str = state.values["dataframe"]
+                df = pd.read_csv(StringIO(df_str))
+                elements = [cl.Dataframe(data=df, display="inline", name="Dataframe")]
+                await cl.Message(content="Report Table:", elements=elements).send()
+        else:
+            await final_answer.stream_token(event)
 
-        # Hack print report by dataframe
-        if (
-            "finish_reason" in msg.response_metadata
-            and msg.response_metadata["finish_reason"] == "stop"
-            and metadata["langgraph_node"] in ["insight"]
-        ):
-            state = graph.get_state(config=config)
-            df_str = state.values["dataframe"]
-            df = pd.read_csv(StringIO(df_str))
-            elements = [cl.Dataframe(data=df, display="inline", name="Dataframe")]
-            await cl.Message(content="Report Table:", elements=elements).send()
+    stream = graph.astream({"messages": [HumanMessage(content=msg.content)]}, stream_mode=["messages", "updates"], config=RunnableConfig(callbacks=[], **config))
+    async for node, event in ordered_stream_events(stream):
+        await emit(node, event)
 
     await final_answer.send()
 
+    # Full querydb result set, paginated by the UI; the answer above only saw a sample
+    state = graph.get_state(config=config)
+    query_df_str = state.values.get("query_dataframe")
+    if query_df_str:
+        df = pd.read_csv(StringIO(query_df_str))
+        elements = [cl.Dataframe(data=df, display="inline", name="Query results")]
+        await cl.Message(content=f"Query results ({len(df)} rows):", elements=elements).send()
+
 @cl.set_starters
 async def set_starters():
     return [
@@ -485,6 +597,7 @@ async def on_chat_resume(thread):
             thread_id = thread["id"]
             config = {"configurable": {"thread_id": thread_id}}
             state = graph.get_state(config).values
+            # Checkpoints persist across restarts; rebuild only threads removed by compaction
             if "messages" not in state:
                 state["messages"] = state_messages
                 graph.update_state(config, state)
@@ -0,0 +1,132 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+import yaml
+
+INTENT_EXAMPLES_PATH = "./src/config/intent_examples.yml"
+# Local decisions below this confidence are escalated to the LLM
+INTENT_CONFIDENCE = float(os.environ.get("INTENT_CONFIDENCE", "0.8"))
+
+# (pattern, weight): positive weights point to querydb, negative weights to reason
+INTENT_RULES = [
+    (r"\bcve-\d{4}-\d{3,}\b", 3.0),
+    (r"\bavd-[a-z]+-\d+\b", 3.0),
+    (r"\b(ksv|aws|ds|gcp|azu)-?\d{3,4}\b", 2.5),
+    (r"\bhow many\b|\bcount\b|\bnumber of\b", 2.0),
+    (r"\b(list|show|top \d+|top|which|prioriti[sz]e)\b", 1.0),
+    (r"\b(critical|high|medium|low)\b( severity| risk)?", 1.5),
+    (r"\b(finding|vulnerabilit|misconfig|issue|cve|risk score)", 1.5),
+    (r"\b(kubernetes|k8s|aws|container|image|code|repo)\b", 1.0),
+    (r"\b(deployment|pod|daemonset|statefulset|cronjob|job|namespace|clusterrole|role|serviceaccount|service account|ingress)s?\b", 1.5),
+    (r"\b(s3|iam|ec2|lambda|rds|eks|athena|dynamodb|kms|cloudtrail|security group|bucket)s?\b", 1.5),
+    (r"\b(package|library|dependency|dependencies|stdlib)\b", 1.0),
+    (r"\b(explain|clarify|rephrase|translate|summari[sz]e (our|the) conversation|analogy)\b", -2.0),
+    (r"\b(what is|what's|what does|what are) (a|an|the)? ?(cvss|trivy|least privilege|difference|supply chain)\b", -2.0),
+    (r"\b(that|this|above|previous|again|shorter|continue)\b", -1.0),
+    (r"^\s*(hi|hello|hey|thanks|thank you|who are you|what can you do)\b", -3.0),
+    (r"\b(in general|best practices?|opinion|email)\b", -1.5),
+]
+COMPILED_RULES = [(re.compile(pattern), weight) for pattern, weight in INTENT_RULES]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+def _features(text: str) -> list:
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+class NaiveBayesIntentModel:
+    """Multinomial naive Bayes over unigrams and bigrams, trained on the seed examples."""
+
+    def __init__(self, examples: dict):
+        self.labels = list(examples)
+        self.counts = {label: Counter() for label in self.labels}
+        self.totals = {}
+        self.priors = {}
+        total_docs = sum(len(texts) for texts in examples.values())
+        for label, texts in examples.items():
+            for text in texts:
+                self.counts[label].update(_features(text))
+            self.totals[label] = sum(self.counts[label].values())
+            self.priors[label] = math.log(len(texts) / total_docs)
+        self.vocab_size = len(set().union(*self.counts.values()))
+
+    def predict_proba(self, text: str) -> dict:
+        features = _features(text)
+        scores = {}
+        for label in self.labels:
+            denominator = self.totals[label] + self.vocab_size
+            scores[label] = self.priors[label] + sum(
+                math.log((self.counts[label][f] + 1) / denominator) for f in features
+            )
+        peak = max(scores.values())
+        exp_scores = {label: math.exp(score - peak) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+class IntentClassifier:
+    """
+    Local querydb/reason classifier run before the LLM.
+
+    Keyword/regex rules over the results schema vocabulary and a naive Bayes model trained on
+    the seed examples each give a querydb probability; their average decides the intent when
+    it is confident enough, otherwise the caller escalates to the LLM. Decision counts by
+    source are kept so the saved LLM calls can be measured.
+    """
+
+    def __init__(self, examples_path: str = INTENT_EXAMPLES_PATH, threshold: float = INTENT_CONFIDENCE):
+        self.threshold = threshold
+        self.model = None
+        try:
+            with open(examples_path, "r", encoding="utf-8") as file:
+                examples = yaml.safe_load(file)
+            self.model = NaiveBayesIntentModel({"querydb": examples["querydb"], "reason": examples["reason"]})
+        except (OSError, KeyError, TypeError, yaml.YAMLError) as e:
+            print(f"Intent model unavailable, using rules only: {e}")
+        self.stats = Counter()
+
+    def rule_probability(self, question: str) -> float:
+        text = question.lower()
+        score = sum(weight for pattern, weight in COMPILED_RULES if pattern.search(text))
+        # Squash the rule score into (0, 1); no matching rule means 0.5
+        return 1 / (1 + math.exp(-score))
+
+    def classify(self, question: str) -> Optional[dict]:
+        """
+        Classify a question locally.
+
+        Args:
+            question (str): The user message.
+
+        Returns:
+            dict | None: {"Score", "Reason", "Source", "Confidence"} in the same shape as the LLM
+            response, or None when the message is ambiguous and should go to the LLM.
+        """
+        rule_p = self.rule_probability(question)
+        if self.model is not None:
+            model_p = self.model.predict_proba(question)["querydb"]
+            probability = (rule_p + model_p) / 2
+            source = "rules+model"
+        else:
+            probability = rule_p
+            source = "rules"
+        confidence = max(probability, 1 - probability)
+        if confidence < self.threshold:
+            return None
+        self.stats[source] += 1
+        return {
+            "Score": round(probability * 100),
+            "Reason": f"Local classifier ({source}) with confidence {confidence:.2f}",
+            "Source": source,
+            "Confidence": round(confidence, 3),
+        }
+
+    def record_llm(self):
+        self.stats["llm"] += 1
+
+    def saved_llm_calls(self) -> dict:
+        local = sum(count for source, count in self.stats.items() if source != "llm")
+        total = local + self.stats["llm"]
+        return {**self.stats, "saved_ratio": local / total if total else 0.0}
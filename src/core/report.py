@@ -0,0 +1,82 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from src.db.db_query import query_summary_sync
+from src.utils.prompts import prompt_registry
+
+# Prompts an executive report depends on; cached reports are versioned by their content
+REPORT_PROMPTS = ["report_system_prompt", "summary_prompt", "insight_prompt", "conclude_prompt"]
+
+def report_version() -> str:
+    return prompt_registry.version(*REPORT_PROMPTS)
+
+def report_data_sync(conn, category: str) -> dict:
+    """
+    Read the summary and top findings of a category. Blocking, run it in an executor.
+
+    :param conn: A sqlite3 connection.
+    :param category: One of the /report categories.
+    :return: dataframe (CSV), result_text, top5 and summary_text strings.
+    """
+    summary_df, details_df = query_summary_sync(conn, category.upper())
+    return {
+        "dataframe": details_df.to_csv(index=False),
+        "result_text": details_df.to_string(index=False),
+        "top5": details_df.to_string(),
+        "summary_text": summary_df.to_string(index=False),
+    }
+
+async def load_report_data(conn, category: str, executor=None) -> dict:
+    """Run report_data_sync off the event loop, on executor or the default one."""
+    return await asyncio.get_running_loop().run_in_executor(executor, report_data_sync, conn, category)
+
+def summary_messages(category: str, summary_text: str, result_text: str) -> list:
+    formatted_prompt = prompt_registry.format(
+        "summary_prompt",
+        category=category,
+        summary=summary_text,
+        result=result_text
+    )
+    return [
+        SystemMessage(content=prompt_registry.text("report_system_prompt")),
+        HumanMessage(content=formatted_prompt)
+    ]
+
+def insight_messages(top5: str) -> list:
+    formatted_prompt = prompt_registry.format("insight_prompt", result=top5)
+    return [
+        SystemMessage(content=prompt_registry.text("report_system_prompt")),
+        HumanMessage(content=formatted_prompt)
+    ]
+
+def conclusion_messages(history: list) -> list:
+    return list(history) + [HumanMessage(content=prompt_registry.text("conclude_prompt"))]
+
+def report_content(data: dict, summary: str, insight: str, conclusion: str) -> dict:
+    """Shape stored in the report cache."""
+    return {
+        "summary": summary,
+        "insight": insight,
+        "conclusion": conclusion,
+        "result_text": data["result_text"],
+        "dataframe": data["dataframe"],
+    }
+
+async def generate_report(conn, category: str, model) -> dict:
+    """
+    Generate an executive report outside of a chat: summary and insight run concurrently,
+    then the conclusion is drawn from both.
+
+    :param conn: A sqlite3 connection usable from worker threads.
+    :param category: One of the /report categories.
+    :param model: The chat model.
+    :return: The report content as stored in the report cache.
+    """
+    data = await load_report_data(conn, category)
+    summary, insight = await asyncio.gather(
+        model.ainvoke(summary_messages(category, data["summary_text"], data["result_text"])),
+        model.ainvoke(insight_messages(data["top5"])),
+    )
+    conclusion = await model.ainvoke(conclusion_messages([HumanMessage(content=f"/report {category}"), summary, insight]))
+    return report_content(data, summary.content, insight.content, conclusion.content)
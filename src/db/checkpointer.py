@@ -0,0 +1,302 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from chainlit.logger import logger
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from src.db.config import CHECKPOINT_TABLE_SCHEMA, DEFAULT_DB_PATH
+
+# Checkpoints kept per thread; older ones are compacted away as new ones are written
+CHECKPOINT_KEEP = int(os.environ.get("CHECKPOINT_KEEP", "3"))
+# Threads whose latest checkpoint is kept in memory
+CHECKPOINT_HOT_THREADS = int(os.environ.get("CHECKPOINT_HOT_THREADS", "128"))
+# Retention across threads: idle threads expire, and only the most recent ones are kept
+CHECKPOINT_MAX_THREADS = int(os.environ.get("CHECKPOINT_MAX_THREADS", "1000"))
+CHECKPOINT_TTL = float(os.environ.get("CHECKPOINT_TTL", str(30 * 24 * 3600)))  # seconds
+CHECKPOINT_COMPACT_EVERY = int(os.environ.get("CHECKPOINT_COMPACT_EVERY", "200"))  # puts
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer persisted in the checkpoints tables of the chat database.
+
+    Every checkpoint row is self-contained (it carries its channel values), so only the
+    latest CHECKPOINT_KEEP checkpoints of a thread are kept. The latest checkpoint of recently
+    used threads is kept serialized in an LRU, so resuming an active conversation does not
+    read the database. Threads idle for longer than the TTL, or beyond the most recent
+    max_threads, are removed by compact().
+    """
+
+    def __init__(
+        self,
+        database_path: str = DEFAULT_DB_PATH,
+        keep: int = CHECKPOINT_KEEP,
+        hot_threads: int = CHECKPOINT_HOT_THREADS,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        ttl: float = CHECKPOINT_TTL,
+        compact_every: int = CHECKPOINT_COMPACT_EVERY,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.database_path = database_path
+        self.keep = max(1, keep)
+        self.hot_threads = max(0, hot_threads)
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.compact_every = max(1, compact_every)
+        self._puts = 0
+        self._lock = threading.RLock()
+        # (thread_id, checkpoint_ns) -> latest checkpoint row and its pending writes, serialized
+        self._hot = OrderedDict()
+        self.conn = sqlite3.connect(self.database_path, check_same_thread=False)
+        self.conn.executescript(CHECKPOINT_TABLE_SCHEMA)
+        self.compact()
+
+    #-------------------------------
+    # Serialization helpers
+    #-------------------------------
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[RunnableConfig]:
+        if not checkpoint_id:
+            return None
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _tuple(self, thread_id, checkpoint_ns, row, writes) -> CheckpointTuple:
+        checkpoint_id, parent_id, ctype, cblob, mtype, mblob = row
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((ctype, cblob)),
+            metadata=self.serde.loads_typed((mtype, mblob)),
+            parent_config=self._config(thread_id, checkpoint_ns, parent_id),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((vtype, value))) for task_id, channel, vtype, value in writes],
+        )
+
+    def _load_writes(self, thread_id, checkpoint_ns, checkpoint_id) -> list:
+        return self.conn.execute(
+            """SELECT task_id, channel, type, value FROM checkpoint_writes
+               WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx""",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+    def _remember(self, key, row, writes):
+        if self.hot_threads == 0:
+            return
+        self._hot[key] = (row, writes)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_threads:
+            self._hot.popitem(last=False)
+
+    #-------------------------------
+    # BaseCheckpointSaver interface
+    #-------------------------------
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        key = (thread_id, checkpoint_ns)
+        with self._lock:
+            hot = self._hot.get(key)
+            if hot is not None and (not checkpoint_id or hot[0][0] == checkpoint_id):
+                self._hot.move_to_end(key)
+                return self._tuple(thread_id, checkpoint_ns, *hot)
+
+            query = """SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata
+                       FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"""
+            params = [thread_id, checkpoint_ns]
+            if checkpoint_id:
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+            else:
+                query += " ORDER BY checkpoint_id DESC LIMIT 1"
+            row = self.conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            writes = self._load_writes(thread_id, checkpoint_ns, row[0])
+            if not checkpoint_id:
+                self._remember(key, row, writes)
+        return self._tuple(thread_id, checkpoint_ns, row, writes)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = """SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata
+                   FROM checkpoints"""
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            with self._lock:
+                writes = self._load_writes(thread_id, checkpoint_ns, row[0])
+            yield self._tuple(thread_id, checkpoint_ns, row, writes)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        ctype, cblob = self.serde.dumps_typed(checkpoint)
+        mtype, mblob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        row = (checkpoint["id"], parent_id, ctype, cblob, mtype, mblob)
+        with self._lock:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO checkpoints
+                   (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (thread_id, checkpoint_ns, *row, time.time()),
+            )
+            self._trim_thread(thread_id, checkpoint_ns)
+            self.conn.commit()
+            self._remember((thread_id, checkpoint_ns), row, [])
+            self._puts += 1
+            if self._puts % self.compact_every == 0:
+                self.compact()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            vtype, vblob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, vtype, vblob, task_path))
+        columns = "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        with self._lock:
+            # Regular writes are stored once per task; special channels (negative idx) are overwritten
+            self.conn.executemany(f"INSERT OR IGNORE INTO checkpoint_writes {columns}", [row for row in rows if row[4] >= 0])
+            self.conn.executemany(f"INSERT OR REPLACE INTO checkpoint_writes {columns}", [row for row in rows if row[4] < 0])
+            self.conn.commit()
+            key = (thread_id, checkpoint_ns)
+            hot = self._hot.get(key)
+            if hot is not None and hot[0][0] == checkpoint_id:
+                self._hot[key] = (hot[0], self._load_writes(thread_id, checkpoint_ns, checkpoint_id))
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("DELETE FROM checkpoint_writes WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+            for key in [key for key in self._hot if key[0] == thread_id]:
+                del self._hot[key]
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    #-------------------------------
+    # Retention
+    #-------------------------------
+    def _trim_thread(self, thread_id: str, checkpoint_ns: str):
+        stale = self.conn.execute(
+            """SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+               ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?""",
+            (thread_id, checkpoint_ns, self.keep),
+        ).fetchall()
+        if not stale:
+            return
+        params = [(thread_id, checkpoint_ns, checkpoint_id) for (checkpoint_id,) in stale]
+        self.conn.executemany("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params)
+        self.conn.executemany("DELETE FROM checkpoint_writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params)
+
+    def compact(self) -> int:
+        """
+        Remove threads idle for longer than the TTL and all but the max_threads most recent ones.
+
+        Returns:
+            int: The number of threads removed.
+        """
+        with self._lock:
+            try:
+                threads = self.conn.execute(
+                    "SELECT thread_id, MAX(created_at) AS last_used FROM checkpoints GROUP BY thread_id ORDER BY last_used DESC"
+                ).fetchall()
+                cutoff = time.time() - self.ttl
+                expired = [
+                    thread_id for index, (thread_id, last_used) in enumerate(threads)
+                    if index >= self.max_threads or (last_used or 0) < cutoff
+                ]
+                if expired:
+                    params = [(thread_id,) for thread_id in expired]
+                    self.conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", params)
+                    self.conn.executemany("DELETE FROM checkpoint_writes WHERE thread_id = ?", params)
+                    self.conn.commit()
+                    expired_set = set(expired)
+                    for key in [key for key in self._hot if key[0] in expired_set]:
+                        del self._hot[key]
+                    logger.info(f"Compacted checkpoints of {len(expired)} threads")
+                return len(expired)
+            except sqlite3.Error as e:
+                logger.error(f"Checkpoint compaction error: {e}")
+                return 0
@@ -20,6 +20,132 @@ CREATE TABLE IF NOT EXISTS results (
 );
 """
 
+# Schema migrations applied in order by db_util.init_db.
+# PRAGMA user_version records the last applied migration version.
+RESULTS_MIGRATIONS = [
+    (1, """
+CREATE INDEX IF NOT EXISTS idx_results_summary ON results (type, avdid, title, description, severity, risk_score);
+CREATE INDEX IF NOT EXISTS idx_results_severity ON results (severity, type, risk_score);
+CREATE INDEX IF NOT EXISTS idx_results_risk_score ON results (risk_score);
+CREATE INDEX IF NOT EXISTS idx_results_resource_name ON results (resource_name COLLATE NOCASE);
+"""),
+    (2, """
+CREATE TABLE IF NOT EXISTS report_summary (
+    "category" TEXT,
+    "type" TEXT,
+    "severity" TEXT,
+    "total_resource_count" INTEGER,
+    "issue_count" INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_report_summary_category ON report_summary (category);
+CREATE TABLE IF NOT EXISTS report_details (
+    "category" TEXT,
+    "rank" INTEGER,
+    "id" TEXT,
+    "type" TEXT,
+    "description" TEXT,
+    "resolution" TEXT,
+    "severity" TEXT,
+    "risk_score" REAL,
+    "resource_count" INTEGER,
+    "resource_names" TEXT,
+    PRIMARY KEY (category, rank)
+);
+"""),
+    (3, """
+CREATE TABLE IF NOT EXISTS scan_state (
+    "id" INTEGER PRIMARY KEY CHECK (id = 1),
+    "generation" INTEGER NOT NULL,
+    "updated_at" TEXT
+);
+INSERT OR IGNORE INTO scan_state (id, generation, updated_at) VALUES (1, 0, NULL);
+"""),
+    (4, """
+CREATE TABLE IF NOT EXISTS import_keys (
+    "type" TEXT,
+    "id" TEXT,
+    "resource_name" TEXT,
+    PRIMARY KEY (type, id, resource_name)
+);
+"""),
+    (5, """
+CREATE TABLE IF NOT EXISTS import_state (
+    "type" TEXT PRIMARY KEY,
+    "score_version" TEXT,
+    "updated_at" TEXT
+);
+"""),
+    (6, """
+ALTER TABLE scan_state ADD COLUMN "importing" INTEGER NOT NULL DEFAULT 0;
+"""),
+]
+
+# Cache of LLM generated CVSS vectors keyed by a hash of the finding content
+CVSS_CACHE_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cvss_cache (
+    "cache_key" TEXT PRIMARY KEY,
+    "avdid" TEXT,
+    "prompt_version" TEXT,
+    "cvss_strings" TEXT,
+    "risk_score" REAL,
+    "created_at" TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cvss_cache_prompt_version ON cvss_cache (prompt_version);
+"""
+
+# Cache of validated text-to-SQL results
+QUERY_CACHE_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_cache (
+    "cache_key" TEXT PRIMARY KEY,
+    "schema_version" TEXT,
+    "category" TEXT,
+    "normalized" TEXT,
+    "sql" TEXT,
+    "created_at" REAL,
+    "last_used" REAL
+);
+"""
+
+# Pre-generated /report outputs, one row per category for the latest scan data generation
+REPORT_CACHE_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_cache (
+    "category" TEXT PRIMARY KEY,
+    "generation" INTEGER,
+    "version" TEXT,
+    "content" TEXT,
+    "created_at" TEXT
+);
+"""
+
+# LangGraph checkpoints; each row holds the full channel values of one checkpoint
+CHECKPOINT_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    "thread_id" TEXT NOT NULL,
+    "checkpoint_ns" TEXT NOT NULL DEFAULT '',
+    "checkpoint_id" TEXT NOT NULL,
+    "parent_checkpoint_id" TEXT,
+    "type" TEXT,
+    "checkpoint" BLOB,
+    "metadata_type" TEXT,
+    "metadata" BLOB,
+    "created_at" REAL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints (created_at);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    "thread_id" TEXT NOT NULL,
+    "checkpoint_ns" TEXT NOT NULL DEFAULT '',
+    "checkpoint_id" TEXT NOT NULL,
+    "task_id" TEXT NOT NULL,
+    "idx" INTEGER NOT NULL,
+    "channel" TEXT NOT NULL,
+    "type" TEXT,
+    "value" BLOB,
+    "task_path" TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
 CHAT_HISTORY_TABLE_SCHEMA = """
 CREATE TABLE users (
     "id" UUID PRIMARY KEY,
@@ -0,0 +1,101 @@
+import datetime
+import hashlib
+import json
+import math
+import sqlite3
+from typing import Iterable, Optional, Tuple
+
+from src.db.config import CVSS_CACHE_TABLE_SCHEMA, DEFAULT_DB_PATH
+from src.db.db_util import CacheStats
+
+CACHE_KEY_FIELDS = ["avdid", "title", "description", "resolution", "severity"]
+
+def _has_score(risk_score) -> bool:
+    # Unparseable vectors score None, or NaN once they went through a DataFrame
+    return risk_score is not None and not (isinstance(risk_score, float) and math.isnan(risk_score))
+
+class CVSSCache(CacheStats):
+    """
+    Persistent cache of CVSS vectors stored in the cvss_cache table next to results.
+
+    Entries are keyed by a hash of the finding content and the scoring prompt version,
+    so rows written with an older prompt are purged when the prompt changes.
+    """
+
+    def __init__(self, version: str, database_path: str = DEFAULT_DB_PATH):
+        self.database_path = database_path
+        self.version = version
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.executescript(CVSS_CACHE_TABLE_SCHEMA)
+            cursor = conn.execute("DELETE FROM cvss_cache WHERE prompt_version != ?", (self.version,))
+            if cursor.rowcount > 0:
+                print(f"Scoring prompt changed, invalidated {cursor.rowcount} cached CVSS vectors")
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"CVSS cache initialization error: {e}")
+
+    def make_key(self, finding: dict) -> str:
+        content = [str(finding.get(field) or "") for field in CACHE_KEY_FIELDS] + [self.version]
+        return hashlib.sha256(json.dumps(content).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        """
+        Look up cached entries and update the hit/miss counters.
+
+        Args:
+            keys (Iterable[str]): Cache keys built with make_key.
+
+        Returns:
+            dict: Mapping of cache key to (cvss_strings, risk_score) for every hit.
+        """
+        keys = list(keys)
+        found = {}
+        try:
+            conn = sqlite3.connect(self.database_path)
+            # Stay well below SQLITE_MAX_VARIABLE_NUMBER
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT cache_key, cvss_strings, risk_score FROM cvss_cache WHERE cache_key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, cvss_strings, risk_score in rows:
+                    # Entries cached without a score before they were skipped are retried
+                    if risk_score is not None:
+                        found[key] = (cvss_strings, risk_score)
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"CVSS cache lookup error: {e}")
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Iterable[Tuple[str, str, Optional[str], Optional[float]]]) -> None:
+        """
+        Store scored entries. Entries without a CVSS vector or without a score parsed from it
+        are skipped so they are retried next time.
+
+        Args:
+            entries (Iterable[tuple]): (cache_key, avdid, cvss_strings, risk_score) tuples.
+        """
+        now = datetime.datetime.now().isoformat()
+        rows = [
+            (key, avdid, self.version, cvss_strings, risk_score, now)
+            for key, avdid, cvss_strings, risk_score in entries
+            if cvss_strings and _has_score(risk_score)
+        ]
+        if not rows:
+            return
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.executemany(
+                "INSERT OR REPLACE INTO cvss_cache (cache_key, avdid, prompt_version, cvss_strings, risk_score, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"CVSS cache write error: {e}")
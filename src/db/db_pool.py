@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from chainlit.logger import logger
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+
+class ReadOnlyConnectionPool:
+    """
+    Pool of read-only sqlite3 connections checked out per request.
+
+    Connections are opened with mode=ro and PRAGMA query_only, and the database is switched
+    to WAL so readers do not block on the chat history writer or an import. Blocking work runs
+    through run() on the pool's own executor, one worker per connection, so one slow query
+    never holds up the event loop or the default executor shared with other sessions.
+    """
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.generation = 0
+        self._idle = []
+        self._created = 0
+        self._available = asyncio.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="db-read")
+        self._enable_wal()
+
+    def _enable_wal(self):
+        # journal_mode is persistent, it only needs a writable connection once
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Unable to enable WAL mode on {self.db_path}: {e}")
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @asynccontextmanager
+    async def connection(self):
+        """Check out a read-only connection for the duration of the block."""
+        async with self._available:
+            while not self._idle and self._created >= self.size:
+                await self._available.wait()
+            if self._idle:
+                conn, generation = self._idle.pop()
+            else:
+                self._created += 1
+                generation = self.generation
+                conn = None
+        try:
+            if conn is None:
+                conn = await asyncio.get_running_loop().run_in_executor(self.executor, self._connect)
+        except Exception:
+            async with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+
+        try:
+            yield conn
+        finally:
+            async with self._available:
+                if generation == self.generation:
+                    self._idle.append((conn, generation))
+                else:
+                    # Pool was reset while this connection was checked out
+                    conn.close()
+                    self._created -= 1
+                self._available.notify()
+
+    async def run(self, func, *args):
+        """
+        Run func(conn, *args) on a checked out connection in the pool's executor.
+
+        Args:
+            func (callable): Blocking function taking a sqlite3 connection first.
+
+        Returns:
+            The return value of func.
+        """
+        async with self.connection() as conn:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, conn, *args)
+
+    def reset(self):
+        """Close idle connections; checked out ones are closed when they are returned."""
+        self.generation += 1
+        idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+        self._created -= len(idle)
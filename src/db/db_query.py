@@ -9,12 +9,19 @@ import asyncio
 import sqlparse
 from sqlalchemy import create_engine, text
 import pandas as pd
-from src.utils.utils import reasoning_prompt
+from src.utils.prompts import prompt_registry
+from src.db.config import DEFAULT_DB_PATH, RESULTS_MIGRATIONS
+
+DB_QUERY_PROMPT_PATH = "./src/prompts/db_query_prompt.txt"
+
+def query_schema_version() -> str:
+    """Version key for generated SQL: the query prompt (which embeds the schema) and the migration level."""
+    return f"{RESULTS_MIGRATIONS[-1][0]}-{prompt_registry.version(DB_QUERY_PROMPT_PATH)}"
 
 # Generate query string
 async def generate_query(q, category, model):
     try:
-        content = reasoning_prompt("./src/prompts/db_query_prompt.txt", QUESTION=q, category=category)
+        content = prompt_registry.format(DB_QUERY_PROMPT_PATH, QUESTION=q, category=category)
         local_messages = [
             SystemMessage(content="You are a SQL query generator. Respond only with a valid SQL query string, with no explanation or additional text. The output must be ready to run directly as a SQL command."),
             HumanMessage(content=content)
@@ -60,36 +67,14 @@ def limit_string_length(resource_string, max_length=200):
         result += new_part
     return result
 
-async def query_summary(conn, cate: str):
-    category = cate.upper()
-    if category not in ["CODE", "KUBERNETES", "AWS", "CONTAINER", "ALL"]:
-        return None, None
-
+REPORT_CATEGORIES = ["CODE", "KUBERNETES", "AWS", "CONTAINER", "ALL"]
+REPORT_TOP_N = 30
 
-    query_one = f"""SELECT
-      id,
-      type,
-      description,
-      resolution,
-      severity,
-      risk_score,
-      COUNT(*) AS resource_count,
-      group_concat(resource_name, ', ') AS resource_names
-    FROM
-      results
-    WHERE
+def summary_query(category: str) -> str:
+    where = "" if category == "ALL" else f"""WHERE
       type = "{category}"
-    GROUP BY
-      type,
-      avdid,
-      title,
-      description,
-      severity,
-      risk_score
-    ORDER BY
-      risk_score DESC;"""
-
-    query_all = f"""SELECT
+    """
+    return f"""SELECT
       id,
       type,
       description,
@@ -100,7 +85,7 @@ async def query_summary(conn, cate: str):
       group_concat(resource_name, ', ') AS resource_names
     FROM
       results
-    GROUP BY
+    {where}GROUP BY
       type,
       avdid,
       title,
@@ -110,16 +95,98 @@ async def query_summary(conn, cate: str):
     ORDER BY
       risk_score DESC;"""
 
-    if category == "ALL":
-        table_df = pd.read_sql_query(query_all, conn)
-    else:
-        table_df = pd.read_sql_query(query_one, conn)
+def compute_summary(conn, category: str):
+    """Aggregate the results table into the per-severity summary and the top-N detail rows."""
+    table_df = pd.read_sql_query(summary_query(category), conn)
 
     summary_df = table_df.groupby(['type','severity']).agg(
         total_resource_count=('resource_count', 'sum'),
         issue_count=('id', 'count')
     ).reset_index()
 
+    table_df = table_df.head(REPORT_TOP_N).copy()
     table_df['resource_names'] = table_df['resource_names'].apply(limit_string_length, max_length=200)
 
-    return summary_df, table_df.head(30)
+    return summary_df, table_df
+
+def materialize_summaries(conn):
+    """
+    Precompute the /report summary and top-N detail tables for every category.
+    Called once per import so report generation is a plain indexed read.
+    """
+    for category in REPORT_CATEGORIES:
+        summary_df, table_df = compute_summary(conn, category)
+        conn.execute("DELETE FROM report_summary WHERE category = ?", (category,))
+        conn.execute("DELETE FROM report_details WHERE category = ?", (category,))
+        conn.executemany(
+            "INSERT INTO report_summary (category, type, severity, total_resource_count, issue_count) VALUES (?, ?, ?, ?, ?)",
+            [(category, r.type, r.severity, int(r.total_resource_count), int(r.issue_count)) for r in summary_df.itertuples(index=False)],
+        )
+        conn.executemany(
+            "INSERT INTO report_details (category, rank, id, type, description, resolution, severity, risk_score, resource_count, resource_names) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (category, rank, r.id, r.type, r.description, r.resolution, r.severity,
+                 None if pd.isna(r.risk_score) else float(r.risk_score), int(r.resource_count), r.resource_names)
+                for rank, r in enumerate(table_df.itertuples(index=False))
+            ],
+        )
+    conn.commit()
+
+def refresh_report_tables(db_path: str = DEFAULT_DB_PATH) -> bool:
+    try:
+        conn = sqlite3.connect(db_path)
+        materialize_summaries(conn)
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"Error refreshing report tables: {e}")
+        return False
+
+def read_materialized_summary(conn, category: str):
+    try:
+        summary_df = pd.read_sql_query(
+            "SELECT type, severity, total_resource_count, issue_count FROM report_summary WHERE category = ? ORDER BY rowid",
+            conn, params=(category,)
+        )
+        if summary_df.empty:
+            return None, None
+        table_df = pd.read_sql_query(
+            "SELECT id, type, description, resolution, severity, risk_score, resource_count, resource_names FROM report_details WHERE category = ? ORDER BY rank",
+            conn, params=(category,)
+        )
+        return summary_df, table_df
+    except Exception as e:
+        print(f"Materialized report tables unavailable: {e}")
+        return None, None
+
+def query_summary_sync(conn, category: str):
+    # Prefer the tables precomputed at import time
+    summary_df, table_df = read_materialized_summary(conn, category)
+    if summary_df is not None:
+        return summary_df, table_df
+
+    return compute_summary(conn, category)
+
+async def query_summary(conn, cate: str):
+    category = cate.upper()
+    if category not in REPORT_CATEGORIES:
+        return None, None
+
+    # Run the blocking sqlite/pandas work off the event loop
+    return await asyncio.to_thread(query_summary_sync, conn, category)
+
+def run_read_query(conn, query: str):
+    """
+    Execute a validated read-only query.
+
+    Returns:
+        tuple: (column names, list of row tuples)
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        records = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        return columns, records
+    finally:
+        cursor.close()
@@ -21,6 +21,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger("db_refresh")
 
+async def table_exists(session, table_name):
+    result = await session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": table_name}
+    )
+    return result.first() is not None
+
 async def refresh_database(db_path, force=False):
     """
     Refresh the database by deleting all records from the 'results' table.
@@ -45,6 +52,12 @@ async def refresh_database(db_path, force=False):
                 delete_stmt = text("DELETE FROM results")
                 await session.execute(delete_stmt)
                 logger.info("Deleted all records from 'results' table.")
+                for table in ("report_summary", "report_details"):
+                    if await table_exists(session, table):
+                        await session.execute(text(f"DELETE FROM {table}"))
+                logger.info("Cleared materialized report tables.")
+                if await table_exists(session, "scan_state"):
+                    await session.execute(text("UPDATE scan_state SET generation = generation + 1 WHERE id = 1"))
             await session.commit()
 
         end_time_str = datetime.datetime.now().isoformat()
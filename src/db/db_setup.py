@@ -7,6 +7,7 @@ from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
 from chainlit.logger import logger
 from src.db.sqlite_storage import SQLiteStorageClient
 from src.db.config import DEFAULT_DB_PATH
+from src.db.db_pool import ReadOnlyConnectionPool, DB_POOL_SIZE
 
 class AppContext:
     def __init__(self):
@@ -14,39 +15,99 @@ class AppContext:
         self.conn = None
         self.engine = None
         self.db_path = DEFAULT_DB_PATH
-        self._last_modified = None
+        self.read_pool = None
+        self.data_generation = None
+        self.importing = False
+        self._sqlite_data_version = None
+        self._listeners = []
 
-    def check_and_reconnect(self):
-        """Check if database file has been modified and reconnect if needed"""
+    def connect(self):
+        """Open the shared connection and engine once; scan data changes are tracked by check_data_version"""
         try:
             if not os.path.exists(self.db_path):
                 logger.error(f"Database file not found: {self.db_path}")
                 return False
-            
-            current_modified = os.path.getmtime(self.db_path)
-            if self._last_modified != current_modified:
-                # Close existing connection if it exists
-                if self.conn:
-                    self.conn.close()
-                
-                # Reconnect
-                self.conn = sqlite3.connect(self.db_path)
+            if self.conn is None:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            if self.engine is None:
                 self.engine = create_engine(f"sqlite:///{self.db_path}")
-                self._last_modified = current_modified
-                return True
-            return False
+            return True
         except (sqlite3.Error, OSError) as e:
-            logger.error(f"Database reconnection error: {e}")
+            logger.error(f"Database connection error: {e}")
             return False
 
+    def _read_generation(self):
+        try:
+            row = self.conn.execute("SELECT generation, importing FROM scan_state WHERE id = 1").fetchone()
+            return (row[0], bool(row[1])) if row else (0, False)
+        except sqlite3.Error:
+            # Database not migrated yet
+            return 0, False
+
+    def check_data_version(self):
+        """
+        Return the current scan data generation, invalidating pooled connections and
+        registered caches when it changed.
+
+        PRAGMA data_version only changes when another connection committed, so the
+        generation row written at the end of each import is read only after a commit.
+        """
+        if self.conn is None and not self.connect():
+            return self.data_generation
+        try:
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Database data_version error: {e}")
+            return self.data_generation
+        if data_version == self._sqlite_data_version:
+            return self.data_generation
+        self._sqlite_data_version = data_version
+
+        generation, self.importing = self._read_generation()
+        if generation != self.data_generation:
+            changed = self.data_generation is not None
+            self.data_generation = generation
+            if changed:
+                logger.info(f"Scan data changed, generation {generation}")
+                if self.read_pool is not None:
+                    self.read_pool.reset()
+                for listener in self._listeners:
+                    listener(generation)
+        return self.data_generation
+
+    def data_settled(self, generation) -> bool:
+        """
+        True if no import is running and the generation is still the current one. Checked
+        after a read, so a result is only cached when no import wrote during the read.
+        """
+        return self.check_data_version() == generation and not self.importing
+
+    def on_data_change(self, listener):
+        """Register a callback invoked with the new generation whenever scan data changes"""
+        self._listeners.append(listener)
+
     def get_connection(self):
-        self.check_and_reconnect()
+        self.check_data_version()
         return self.conn
     
     def get_engine(self):
-        self.check_and_reconnect()
+        self.connect()
         return self.engine
 
+    def read_connection(self):
+        """Check out a pooled read-only connection: `async with app_context.read_connection() as conn`"""
+        if self.read_pool is None:
+            self.read_pool = ReadOnlyConnectionPool(self.db_path, DB_POOL_SIZE)
+        self.check_data_version()
+        return self.read_pool.connection()
+
+    async def run_read(self, func, *args):
+        """Run blocking func(conn, *args) on a pooled read-only connection in the database executor"""
+        if self.read_pool is None:
+            self.read_pool = ReadOnlyConnectionPool(self.db_path, DB_POOL_SIZE)
+        self.check_data_version()
+        return await self.read_pool.run(func, *args)
+
 def setup_database_connections():
     """
     Configure and return database connections based on environment
@@ -54,7 +115,9 @@ def setup_database_connections():
 
     app_context = AppContext()
     # Initial connection
-    app_context.check_and_reconnect()
+    app_context.connect()
+    app_context.check_data_version()
+    app_context.read_pool = ReadOnlyConnectionPool(app_context.db_path, DB_POOL_SIZE)
 
     # SQLite setup
     conn_str = f"sqlite+aiosqlite:///{app_context.db_path}"
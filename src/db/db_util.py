@@ -1,15 +1,19 @@
 import asyncio
 import csv
+import datetime
 import os
-from sqlalchemy import Column, Integer, String, Float, Text, PrimaryKeyConstraint, select
+from sqlalchemy import Column, Integer, String, Float, Text, PrimaryKeyConstraint, select, func, tuple_
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
 import json
+import math
 import sqlite3
+from itertools import islice
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 # Import from config module
-from src.db.config import RESULTS_TABLE_SCHEMA, CHAT_HISTORY_TABLE_SCHEMA, SAMPLE_DATA, DEFAULT_DB_PATH
+from src.db.config import RESULTS_TABLE_SCHEMA, CHAT_HISTORY_TABLE_SCHEMA, SAMPLE_DATA, DEFAULT_DB_PATH, RESULTS_MIGRATIONS
 
 # Define the base class for declarative models
 Base = declarative_base()
@@ -40,6 +44,26 @@ class Results(Base):
         attributes = ", ".join(f"{key}={repr(value)}" for key, value in vars(self).items())
         return f"<Results({attributes})>"
 
+# Findings seen by the running import of a type, diffed against results when it finishes
+class ImportKeys(Base):
+    __tablename__ = "import_keys"
+
+    type = Column(String)
+    id = Column(String)
+    resource_name = Column(String)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("type", "id", "resource_name"),
+    )
+
+# Scoring prompt version the stored results of a type were scored with by the last import
+class ImportState(Base):
+    __tablename__ = "import_state"
+
+    type = Column(String, primary_key=True)
+    score_version = Column(String)
+    updated_at = Column(String)
+
 # Create an async engine; using the "aiosqlite" dialect for SQLite.
 DATABASE_URL = f"sqlite+aiosqlite:///{DEFAULT_DB_PATH}"
 engine = create_async_engine(DATABASE_URL, echo=True)
@@ -47,6 +71,22 @@ engine = create_async_engine(DATABASE_URL, echo=True)
 # Create a session maker for async sessions.
 AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+class CacheStats:
+    """
+    Hit and miss counters of a cache. Caches count into hits and misses, and extend stats()
+    with their own size fields.
+    """
+    hits = 0
+    misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
 def ensure_directory_exists(db_path):
     """
     Ensure the directory for the database file exists.
@@ -88,6 +128,117 @@ async def init_db_with_raw_sql(db_path, sql_script):
         print(f"Error creating tables with raw SQL: {e}")
         return False
 
+def apply_migrations_sync(db_path, migrations=RESULTS_MIGRATIONS):
+    """
+    Apply pending schema migrations, tracked by PRAGMA user_version, then refresh planner statistics.
+
+    Args:
+        db_path (str): Path to the database file
+        migrations (list): (version, sql_script) pairs in ascending version order
+
+    Returns:
+        int: Number of migrations applied
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        applied = 0
+        for version, sql_script in migrations:
+            if version <= current:
+                continue
+            print(f"Applying schema migration {version}")
+            conn.executescript(sql_script)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            applied += 1
+        if applied:
+            conn.execute("ANALYZE")
+            conn.commit()
+        return applied
+    finally:
+        conn.close()
+
+async def apply_migrations(db_path=DEFAULT_DB_PATH):
+    """
+    Apply pending schema migrations (async version).
+
+    Args:
+        db_path (str): Path to the database file
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, apply_migrations_sync, db_path)
+
+def _analyze_sync(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+async def analyze_db(db_path=DEFAULT_DB_PATH):
+    """
+    Refresh the query planner statistics, e.g. after an import changed the data distribution.
+
+    Args:
+        db_path (str): Path to the database file
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, _analyze_sync, db_path)
+    except sqlite3.Error as e:
+        print(f"Error running ANALYZE: {e}")
+
+def begin_import_sync(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE scan_state SET importing = 1, updated_at = ? WHERE id = 1", (datetime.datetime.now().isoformat(),))
+        conn.commit()
+    finally:
+        conn.close()
+
+async def begin_import(db_path=DEFAULT_DB_PATH):
+    """
+    Mark an import as in progress before its first write, so readers do not cache results
+    of half-imported data. bump_data_generation clears the mark.
+
+    Args:
+        db_path (str): Path to the database file
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, begin_import_sync, db_path)
+    except sqlite3.Error as e:
+        print(f"Error marking the import as in progress: {e}")
+
+def bump_data_generation_sync(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            "UPDATE scan_state SET generation = generation + 1, importing = 0, updated_at = ? WHERE id = 1",
+            (datetime.datetime.now().isoformat(),)
+        )
+        conn.commit()
+        return conn.execute("SELECT generation FROM scan_state WHERE id = 1").fetchone()[0]
+    finally:
+        conn.close()
+
+async def bump_data_generation(db_path=DEFAULT_DB_PATH):
+    """
+    Advance the scan data generation once an import has committed and clear its in progress
+    mark, so readers invalidate connections and caches only when scan data actually changed.
+
+    Args:
+        db_path (str): Path to the database file
+
+    Returns:
+        int: The new generation, or None if it could not be written
+    """
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, bump_data_generation_sync, db_path)
+    except sqlite3.Error as e:
+        print(f"Error updating scan data generation: {e}")
+        return None
+
 async def init_db(db_path=DEFAULT_DB_PATH):
     """
     Initialize the database by creating the necessary tables (async version).
@@ -111,12 +262,21 @@ async def init_db(db_path=DEFAULT_DB_PATH):
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
             print("Tables created successfully using SQLAlchemy")
-        return True
+        created = True
     except Exception as e:
         print(f"Error creating tables with SQLAlchemy: {e}")
         
         # Fallback to raw SQL as a backup method
-        return await init_db_with_raw_sql(db_path, RESULTS_TABLE_SCHEMA)
+        created = await init_db_with_raw_sql(db_path, RESULTS_TABLE_SCHEMA)
+
+    if not created:
+        return False
+    try:
+        await apply_migrations(db_path)
+        return True
+    except sqlite3.Error as e:
+        print(f"Error applying schema migrations: {e}")
+        return False
 
 async def init_sample(db_path=DEFAULT_DB_PATH):
     """
@@ -136,6 +296,10 @@ async def init_sample(db_path=DEFAULT_DB_PATH):
     # Then add sample data using batch_upsert_records
     try:
         await batch_upsert_records(SAMPLE_DATA)
+        # Imported lazily, db_query depends on the langchain stack
+        from src.db.db_query import refresh_report_tables
+        refresh_report_tables(db_path)
+        await bump_data_generation(db_path)
         print(f"Sample data added successfully to {db_path}")
         return True
     except Exception as e:
@@ -187,6 +351,224 @@ async def batch_upsert_records(records_data: list[dict]) -> list[Results]:
         print(f"Error batch upserting records: {e}")
         raise
 
+BULK_UPSERT_CHUNK_SIZE = int(os.environ.get("BULK_UPSERT_CHUNK_SIZE", "1000"))
+
+RESULTS_COLUMNS = [c.name for c in Results.__table__.columns]
+
+def _clean_record(record: dict) -> dict:
+    # Keep only results columns and map pandas NaN to NULL
+    return {
+        col: (None if isinstance(record.get(col), float) and math.isnan(record.get(col)) else record.get(col))
+        for col in RESULTS_COLUMNS
+    }
+
+def _iter_records(records):
+    # Accept a DataFrame as well as any iterable of dicts
+    if hasattr(records, "itertuples") and hasattr(records, "columns"):
+        columns = list(records.columns)
+        for row in records.itertuples(index=False, name=None):
+            yield dict(zip(columns, row))
+    else:
+        yield from records
+
+def _upsert_statement():
+    stmt = sqlite_insert(Results.__table__)
+    key_cols = ["type", "id", "resource_name"]
+    return stmt.on_conflict_do_update(
+        index_elements=key_cols,
+        set_={col: stmt.excluded[col] for col in RESULTS_COLUMNS if col not in key_cols},
+    )
+
+async def bulk_upsert_records(records, chunk_size: int = BULK_UPSERT_CHUNK_SIZE) -> dict:
+    """
+    Upsert records into the results table with chunked INSERT ... ON CONFLICT DO UPDATE
+    statements executed executemany-style inside a single transaction.
+
+    Args:
+        records (DataFrame | Iterable[dict]): The rows to upsert.
+        chunk_size (int): Number of rows sent per executemany call.
+
+    Returns:
+        dict: Counts of rows "inserted", "updated" and "total" processed.
+    """
+    stmt = _upsert_statement()
+    count_stmt = select(func.count()).select_from(Results.__table__)
+    total = 0
+    try:
+        async with engine.begin() as conn:
+            before = (await conn.execute(count_stmt)).scalar_one()
+            iterator = _iter_records(records)
+            while True:
+                chunk = [_clean_record(r) for r in islice(iterator, chunk_size)]
+                if not chunk:
+                    break
+                await conn.execute(stmt, chunk)
+                total += len(chunk)
+            after = (await conn.execute(count_stmt)).scalar_one()
+        inserted = after - before
+        return {"inserted": inserted, "updated": total - inserted, "total": total}
+    except SQLAlchemyError as e:
+        print(f"Error bulk upserting records: {e}")
+        raise
+
+def _key_chunks(keys, chunk_size: int):
+    iterator = iter(keys)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+async def clear_import_keys(record_type: str):
+    """
+    Forget the findings recorded by the previous import of a type.
+
+    Args:
+        record_type (str): The type value of the rows.
+    """
+    table = ImportKeys.__table__
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(table.delete().where(table.c.type == record_type))
+    except SQLAlchemyError as e:
+        print(f"Error clearing import keys: {e}")
+        raise
+
+async def claim_import_keys(record_type: str, keys: list, chunk_size: int = BULK_UPSERT_CHUNK_SIZE) -> set:
+    """
+    Record the findings seen by the running import of a type in the import_keys table,
+    so the import keeps no per-finding state in memory.
+
+    Args:
+        record_type (str): The type value of the rows.
+        keys (list[tuple]): Distinct (id, resource_name) pairs of the current chunk.
+        chunk_size (int): Number of keys looked up per statement.
+
+    Returns:
+        set: The keys not recorded by an earlier chunk of the same import.
+    """
+    table = ImportKeys.__table__
+    claimed = set()
+    try:
+        async with engine.begin() as conn:
+            for chunk in _key_chunks(keys, chunk_size):
+                seen = await conn.execute(
+                    select(table.c.id, table.c.resource_name).where(
+                        table.c.type == record_type,
+                        tuple_(table.c.id, table.c.resource_name).in_(chunk),
+                    )
+                )
+                seen = {tuple(row) for row in seen}
+                new = [key for key in chunk if key not in seen]
+                if new:
+                    await conn.execute(
+                        table.insert(),
+                        [{"type": record_type, "id": key[0], "resource_name": key[1]} for key in new],
+                    )
+                claimed.update(new)
+        return claimed
+    except SQLAlchemyError as e:
+        print(f"Error recording import keys: {e}")
+        raise
+
+async def fetch_records_by_keys(record_type: str, keys: list, columns: list, chunk_size: int = BULK_UPSERT_CHUNK_SIZE) -> dict:
+    """
+    Fetch the stored results rows of a type by primary key.
+
+    Args:
+        record_type (str): The type value of the rows.
+        keys (list[tuple]): (id, resource_name) pairs to fetch.
+        columns (list): The columns to return.
+        chunk_size (int): Number of keys looked up per statement.
+
+    Returns:
+        dict: {(id, resource_name): row dict} for every stored key.
+    """
+    table = Results.__table__
+    found = {}
+    try:
+        async with engine.connect() as conn:
+            for chunk in _key_chunks(keys, chunk_size):
+                result = await conn.execute(
+                    select(*[table.c[col] for col in columns]).where(
+                        table.c.type == record_type,
+                        tuple_(table.c.id, table.c.resource_name).in_(chunk),
+                    )
+                )
+                for row in result.mappings():
+                    found[(row["id"], row["resource_name"])] = dict(row)
+        return found
+    except SQLAlchemyError as e:
+        print(f"Error fetching records: {e}")
+        raise
+
+async def delete_unclaimed_records(record_type: str) -> int:
+    """
+    Delete the results rows of a type the running import did not record in import_keys,
+    i.e. findings that are no longer reported, then clear the recorded keys.
+
+    Args:
+        record_type (str): The type value of the rows.
+
+    Returns:
+        int: Number of rows deleted.
+    """
+    table = Results.__table__
+    keys = ImportKeys.__table__
+    claimed = select(keys.c.id).where(
+        keys.c.type == table.c.type,
+        keys.c.id == table.c.id,
+        keys.c.resource_name == table.c.resource_name,
+    ).exists()
+    try:
+        async with engine.begin() as conn:
+            result = await conn.execute(table.delete().where(table.c.type == record_type, ~claimed))
+            await conn.execute(keys.delete().where(keys.c.type == record_type))
+        return result.rowcount
+    except SQLAlchemyError as e:
+        print(f"Error deleting records: {e}")
+        raise
+
+async def get_score_version(record_type: str):
+    """
+    The scoring prompt version the stored results of a type were scored with.
+
+    Args:
+        record_type (str): The type value of the rows.
+
+    Returns:
+        str: The version, or None if no finished import of the type recorded one.
+    """
+    table = ImportState.__table__
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(select(table.c.score_version).where(table.c.type == record_type))
+            return result.scalar_one_or_none()
+    except SQLAlchemyError as e:
+        print(f"Error reading import state: {e}")
+        raise
+
+async def set_score_version(record_type: str, version: str):
+    """
+    Record the scoring prompt version of a finished import of a type.
+
+    Args:
+        record_type (str): The type value of the rows.
+        version (str): The scoring prompt version.
+    """
+    table = ImportState.__table__
+    stmt = sqlite_insert(table).values(type=record_type, score_version=version, updated_at=datetime.datetime.now().isoformat())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["type"],
+        set_={"score_version": stmt.excluded.score_version, "updated_at": stmt.excluded.updated_at},
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(stmt)
+    except SQLAlchemyError as e:
+        print(f"Error writing import state: {e}")
+        raise
+
 async def query_records(record_type: str):
     """
     Query records from the results table filtered by the type column.
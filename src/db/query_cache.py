@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.db.config import QUERY_CACHE_TABLE_SCHEMA, DEFAULT_DB_PATH
+from src.db.db_util import CacheStats
+
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1000"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+QUERY_CACHE_SIMILARITY = float(os.environ.get("QUERY_CACHE_SIMILARITY", "0.85"))
+
+STOPWORDS = {
+    "a", "an", "the", "me", "my", "our", "we", "i", "you", "please", "can", "could", "would",
+    "show", "list", "give", "tell", "display", "get", "find", "what", "which", "are", "is",
+    "there", "of", "in", "on", "for", "from", "to", "and", "all", "any", "do", "does", "have",
+    "has", "about", "with", "current", "scan", "scanned",
+}
+
+# Tokens that change the meaning of a query; similar questions must agree on them
+SIGNIFICANT_TOKENS = {
+    "low", "medium", "high", "critical", "unknown", "code", "container", "kubernetes", "k8s", "aws",
+    "not", "no", "without", "except", "top", "most", "least", "highest", "lowest", "count", "many",
+}
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-./:]*")
+# A value in quotes, e.g. a resource name: 'nginx-ingress' or "default"
+QUOTED_PATTERN = re.compile(r"(?<!\w)(['\"`])([^'\"`]+?)\1(?!\w)")
+# Characters found in resource names, package names and IDs but not in plain words
+IDENTIFIER_CHARS = set("0123456789_-./:")
+# Prefix marking a token as a literal value; similar questions must agree on it
+LITERAL_MARK = "="
+# Words followed by the name of a resource, e.g. "deployments named frontend"
+NAME_CUES = {"named", "called", "namespace", "cluster", "package", "image", "bucket", "repository", "repo", "account", "user", "role"}
+
+def tokenize(question: str) -> list:
+    """
+    Drop punctuation and stopwords, lowercase and strip plural endings. Quoted values,
+    mixed case words such as ServiceAccount and the word after a name cue ("named frontend")
+    are kept whole and marked as literals.
+    """
+    tokens = []
+    for match in QUOTED_PATTERN.finditer(question):
+        value = "_".join(match.group(2).lower().split())
+        if value:
+            tokens.append(LITERAL_MARK + value)
+    previous = None
+    for word in TOKEN_PATTERN.findall(QUOTED_PATTERN.sub(" ", question)):
+        word = word.rstrip(".:-/")
+        token = word.lower()
+        after_cue, previous = previous in NAME_CUES, token
+        if not token or token in STOPWORDS:
+            continue
+        if token not in NAME_CUES and token not in SIGNIFICANT_TOKENS and (after_cue or any(c.isupper() for c in word[1:])):
+            tokens.append(LITERAL_MARK + token)
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not IDENTIFIER_CHARS.intersection(token):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def normalize_question(question: str) -> str:
+    return " ".join(sorted(set(tokenize(question))))
+
+def _is_significant(token: str) -> bool:
+    # Severity, type and negation words, literals and identifiers (CVE IDs, resource names)
+    return token in SIGNIFICANT_TOKENS or token.startswith(LITERAL_MARK) or bool(IDENTIFIER_CHARS.intersection(token))
+
+class QueryCache(CacheStats):
+    """
+    Cache of validated text-to-SQL results persisted in the query_cache table.
+
+    Entries are keyed by normalized question, report category and schema version. Lookups
+    try an exact match on the normalized question first, then a token-set (Jaccard) match
+    against cached questions sharing a token, as long as both questions agree on every
+    significant token (severity, resource type, negations, quoted values and identifiers
+    such as CVE IDs or resource names). The in-memory copy is LRU bounded, hits update
+    last_used so the order survives restarts, and entries expire after a TTL.
+    """
+
+    def __init__(
+        self,
+        schema_version: str,
+        database_path: str = DEFAULT_DB_PATH,
+        max_size: int = QUERY_CACHE_SIZE,
+        ttl: float = QUERY_CACHE_TTL,
+        similarity: float = QUERY_CACHE_SIMILARITY,
+    ):
+        self.database_path = database_path
+        self.schema_version = schema_version
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.similarity = similarity
+        # cache_key -> {"category", "normalized", "tokens", "sql", "created_at"}
+        self._entries = OrderedDict()
+        # (category, token) -> set of cache keys
+        self._token_index = {}
+        self._load()
+
+    def _key(self, normalized: str, category: str) -> str:
+        return hashlib.sha256(f"{self.schema_version}\0{category}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.executescript(QUERY_CACHE_TABLE_SCHEMA)
+            # Entries for another schema version or past their TTL are never served again
+            conn.execute(
+                "DELETE FROM query_cache WHERE schema_version != ? OR created_at < ?",
+                (self.schema_version, time.time() - self.ttl),
+            )
+            conn.commit()
+            rows = conn.execute(
+                "SELECT cache_key, category, normalized, sql, created_at FROM query_cache ORDER BY last_used DESC LIMIT ?",
+                (self.max_size,),
+            ).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Query cache initialization error: {e}")
+            return
+        for key, category, normalized, sql, created_at in reversed(rows):
+            self._add(key, category, normalized, sql, created_at)
+
+    def _add(self, key, category, normalized, sql, created_at):
+        tokens = frozenset(normalized.split())
+        self._entries[key] = {"category": category, "normalized": normalized, "tokens": tokens, "sql": sql, "created_at": created_at}
+        self._entries.move_to_end(key)
+        for token in tokens:
+            self._token_index.setdefault((category, token), set()).add(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for token in entry["tokens"]:
+            keys = self._token_index.get((entry["category"], token))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._token_index[(entry["category"], token)]
+
+    def _similar(self, tokens: frozenset, category: str) -> Optional[str]:
+        candidates = set()
+        for token in tokens:
+            candidates |= self._token_index.get((category, token), set())
+        best_key, best_score = None, 0.0
+        for key in candidates:
+            other = self._entries[key]["tokens"]
+            difference = tokens ^ other
+            if any(_is_significant(token) for token in difference):
+                continue
+            score = len(tokens & other) / len(tokens | other)
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_score >= self.similarity:
+            return best_key
+        return None
+
+    async def get(self, question: str, category: str) -> Optional[str]:
+        """
+        Return the cached SQL for a question, or None on a miss.
+
+        Args:
+            question (str): The user question.
+            category (str): The report category the query is scoped to.
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            self.misses += 1
+            return None
+        key = self._key(normalized, category)
+        if key not in self._entries:
+            key = self._similar(frozenset(normalized.split()), category)
+        if key is None:
+            self.misses += 1
+            return None
+        entry = self._entries[key]
+        if time.time() - entry["created_at"] > self.ttl:
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        await asyncio.to_thread(self._touch, key, time.time())
+        return entry["sql"]
+
+    async def evict(self, category: str, sql: str):
+        """
+        Drop every entry of a category serving sql, e.g. once it failed validation or execution.
+
+        Args:
+            category (str): The report category the query is scoped to.
+            sql (str): The cached SQL that failed.
+        """
+        keys = [key for key, entry in self._entries.items() if entry["category"] == category and entry["sql"] == sql]
+        for key in keys:
+            self._remove(key)
+        if keys:
+            await asyncio.to_thread(self._delete, [(key,) for key in keys])
+
+    async def put(self, question: str, category: str, sql: str):
+        """
+        Store validated SQL for a question, evicting the least recently used entries.
+
+        Args:
+            question (str): The user question.
+            category (str): The report category the query is scoped to.
+            sql (str): SQL that passed validation and executed successfully.
+        """
+        normalized = normalize_question(question)
+        if not normalized or not sql:
+            return
+        key = self._key(normalized, category)
+        now = time.time()
+        self._remove(key)
+        self._add(key, category, normalized, sql, now)
+        evicted = []
+        while len(self._entries) > self.max_size:
+            old_key = next(iter(self._entries))
+            self._remove(old_key)
+            evicted.append((old_key,))
+        await asyncio.to_thread(self._persist, (key, self.schema_version, category, normalized, sql, now, now), evicted)
+
+    def _persist(self, row, evicted):
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache (cache_key, schema_version, category, normalized, sql, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            if evicted:
+                conn.executemany("DELETE FROM query_cache WHERE cache_key = ?", evicted)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Query cache write error: {e}")
+
+    def _touch(self, key, now):
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.execute("UPDATE query_cache SET last_used = ? WHERE cache_key = ?", (now, key))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Query cache write error: {e}")
+
+    def _delete(self, keys):
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.executemany("DELETE FROM query_cache WHERE cache_key = ?", keys)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Query cache write error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "size": len(self._entries),
+        }
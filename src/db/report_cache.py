@@ -0,0 +1,73 @@
+import datetime
+import json
+import sqlite3
+from typing import Optional
+
+from src.db.config import REPORT_CACHE_TABLE_SCHEMA, DEFAULT_DB_PATH
+from src.db.db_util import CacheStats
+
+class ReportCache(CacheStats):
+    """
+    Pre-generated executive reports stored in the report_cache table.
+
+    A report is only served for the scan data generation and report prompt version it was
+    generated with; storing a newer one replaces the previous row for the category.
+    """
+
+    def __init__(self, database_path: str = DEFAULT_DB_PATH):
+        self.database_path = database_path
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.executescript(REPORT_CACHE_TABLE_SCHEMA)
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Report cache initialization error: {e}")
+
+    def get(self, category: str, generation: int, version: str) -> Optional[dict]:
+        """
+        Return the cached report for a category, or None when missing or stale.
+
+        Args:
+            category (str): The report category.
+            generation (int): The current scan data generation.
+            version (str): The current report prompt version.
+
+        Returns:
+            dict | None: The report content stored with put.
+        """
+        try:
+            conn = sqlite3.connect(self.database_path)
+            row = conn.execute(
+                "SELECT content FROM report_cache WHERE category = ? AND generation = ? AND version = ?",
+                (category, generation, version),
+            ).fetchone()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Report cache lookup error: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, category: str, generation: int, version: str, report: dict) -> None:
+        """
+        Store a generated report for a category, replacing the previous one.
+
+        Args:
+            category (str): The report category.
+            generation (int): The scan data generation the report was generated from.
+            version (str): The report prompt version.
+            report (dict): JSON serializable report content.
+        """
+        try:
+            conn = sqlite3.connect(self.database_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO report_cache (category, generation, version, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (category, generation, version, json.dumps(report), datetime.datetime.now().isoformat()),
+            )
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Report cache write error: {e}")
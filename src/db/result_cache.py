@@ -0,0 +1,107 @@
+import os
+import sys
+from collections import OrderedDict
+from typing import Optional
+
+import sqlparse
+
+from src.db.db_util import CacheStats
+
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+def canonicalize_sql(query: str) -> str:
+    """Normalize keyword case, comments and whitespace so equivalent SQL shares a cache key."""
+    formatted = sqlparse.format(query, keyword_case="upper", strip_comments=True, strip_whitespace=True)
+    # Whitespace is collapsed between tokens only, never inside string literals
+    parts = []
+    for statement in sqlparse.parse(formatted):
+        for token in statement.flatten():
+            if token.is_whitespace:
+                if parts and parts[-1] != " ":
+                    parts.append(" ")
+            elif token.ttype in sqlparse.tokens.Operator.Comparison and token.value.isalpha():
+                # LIKE, ILIKE, ... are comparisons, not keywords, for keyword_case
+                parts.append(token.value.upper())
+            else:
+                parts.append(token.value)
+    return "".join(parts).strip().rstrip(";").strip()
+
+def _estimate_size(columns: list, data: list) -> int:
+    size = sys.getsizeof(columns) + sum(sys.getsizeof(c) for c in columns)
+    for column in data:
+        size += sys.getsizeof(column)
+        for value in column:
+            size += sys.getsizeof(value) if value is not None else 0
+    return size
+
+class QueryResultCache(CacheStats):
+    """
+    Bounded in-memory cache of query results keyed by canonical SQL and scan data generation.
+
+    Results are stored column by column (one tuple per column) and evicted least recently
+    used first once the estimated memory size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # (canonical_sql, generation) -> (columns, column tuples, row count, size)
+        self._entries = OrderedDict()
+
+    def get(self, query: str, generation) -> Optional[tuple]:
+        """
+        Return (columns, records) for a cached query, or None on a miss.
+
+        Args:
+            query (str): The SQL query.
+            generation: The scan data generation the result was computed for.
+        """
+        key = (canonicalize_sql(query), generation)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        columns, data, row_count, _ = entry
+        records = list(zip(*data)) if data else [()] * row_count
+        return columns, records
+
+    def put(self, query: str, generation, columns: list, records: list):
+        """
+        Store a query result, evicting least recently used entries to stay within max_bytes.
+
+        Args:
+            query (str): The SQL query.
+            generation: The scan data generation the result was computed for.
+            columns (list): Column names.
+            records (list): Row tuples.
+        """
+        key = (canonicalize_sql(query), generation)
+        data = [tuple(column) for column in zip(*records)] if records else []
+        size = _estimate_size(columns, data)
+        # A single result may not take over the cache
+        if size > self.max_bytes // 4:
+            return
+        self._discard(key)
+        self._entries[key] = (list(columns), data, len(records), size)
+        self.size += size
+        while self.size > self.max_bytes and self._entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[3]
+
+    def clear(self, *_):
+        """Drop every entry, e.g. when the scan data generation changes."""
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
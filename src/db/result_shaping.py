@@ -0,0 +1,135 @@
+import os
+from collections import Counter
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from src.utils.tokens import count_tokens
+
+RESULT_FETCH_SIZE = int(os.environ.get("RESULT_FETCH_SIZE", "500"))
+# Token budget for the sample rows included in the explanation prompt
+RESULT_PROMPT_TOKENS = int(os.environ.get("RESULT_PROMPT_TOKENS", "6000"))
+# Rows kept for the UI table and the result cache; aggregates always cover every row
+RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", "10000"))
+
+# Columns aggregated when a query returns them
+COUNT_COLUMNS = ["severity", "type"]
+TOP_COLUMNS = ["resource_name", "avdid"]
+TOP_N = 10
+
+class ResultShaper:
+    """
+    One pass over query rows: counts by severity and type, the most frequent resources and
+    findings, risk score range, a token budgeted sample of whole rows for the prompt and up
+    to max_rows rows for the UI.
+    """
+
+    def __init__(self, columns: list, prompt_tokens: int = RESULT_PROMPT_TOKENS, max_rows: int = RESULT_MAX_ROWS):
+        self.columns = list(columns)
+        self.prompt_tokens = prompt_tokens
+        self.max_rows = max_rows
+        self.row_count = 0
+        self.rows = []
+        self.truncated = False
+        self.sample = []
+        self.sample_tokens = 0
+        self.sample_full = False
+        lower = [column.lower() for column in self.columns]
+        self.count_indexes = {c: lower.index(c) for c in COUNT_COLUMNS if c in lower}
+        self.top_indexes = {c: lower.index(c) for c in TOP_COLUMNS if c in lower}
+        self.risk_index = lower.index("risk_score") if "risk_score" in lower else None
+        self.aggregate_indexes = list({**self.count_indexes, **self.top_indexes}.items())
+        self.counts = {c: Counter() for c, _ in self.aggregate_indexes}
+        self.risk_min = None
+        self.risk_max = None
+        self.risk_sum = 0.0
+        self.risk_count = 0
+
+    def feed(self, rows: Iterable[tuple]):
+        for row in rows:
+            self.row_count += 1
+            if len(self.rows) < self.max_rows:
+                self.rows.append(row)
+            else:
+                self.truncated = True
+            for column, index in self.aggregate_indexes:
+                self.counts[column][row[index]] += 1
+            if self.risk_index is not None and isinstance(row[self.risk_index], (int, float)):
+                risk = float(row[self.risk_index])
+                self.risk_min = risk if self.risk_min is None else min(self.risk_min, risk)
+                self.risk_max = risk if self.risk_max is None else max(self.risk_max, risk)
+                self.risk_sum += risk
+                self.risk_count += 1
+            if not self.sample_full:
+                self._add_sample(row)
+
+    def _add_sample(self, row: tuple):
+        line = str(dict(zip(self.columns, row)))
+        tokens = count_tokens(line)
+        # Only whole rows go into the prompt
+        if self.sample_tokens + tokens > self.prompt_tokens:
+            self.sample_full = True
+            return
+        self.sample.append(line)
+        self.sample_tokens += tokens
+
+    def summary(self) -> str:
+        """Aggregate statistics over every row, as text for the prompt."""
+        lines = [f"Total rows: {self.row_count}"]
+        for column in self.count_indexes:
+            counts = ", ".join(f"{value}: {count}" for value, count in self.counts[column].most_common())
+            lines.append(f"Rows by {column}: {counts}")
+        for column in self.top_indexes:
+            top = ", ".join(f"{value} ({count})" for value, count in self.counts[column].most_common(TOP_N))
+            lines.append(f"Most frequent {column}: {top}")
+        if self.risk_count:
+            lines.append(
+                f"risk_score: min {self.risk_min:g}, max {self.risk_max:g}, average {self.risk_sum / self.risk_count:.2f}"
+            )
+        return "\n".join(lines)
+
+    def to_prompt(self) -> str:
+        if self.row_count == 0:
+            return "No results returned."
+        header = self.summary()
+        if len(self.sample) < self.row_count:
+            header += f"\nShowing {len(self.sample)} of {self.row_count} rows:"
+        return header + "\n" + "\n".join(self.sample)
+
+    def to_csv(self) -> Optional[str]:
+        """Rows kept for the UI table as CSV, or None when there are none."""
+        if not self.rows:
+            return None
+        return pd.DataFrame(self.rows, columns=self.columns).to_csv(index=False)
+
+def shape_query(conn, query: str, fetch_size: int = RESULT_FETCH_SIZE, **kwargs) -> ResultShaper:
+    """
+    Execute a validated read-only query and shape its rows as they are fetched.
+
+    Args:
+        conn: A sqlite3 connection.
+        query (str): The SQL query.
+        fetch_size (int): Rows fetched per fetchmany call.
+
+    Returns:
+        ResultShaper: The shaped result.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        shaper = ResultShaper(columns, **kwargs)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            shaper.feed(rows)
+        return shaper
+    finally:
+        cursor.close()
+
+def shape_rows(columns: list, rows: Iterable[tuple], **kwargs) -> ResultShaper:
+    """Shape rows that are already in memory, e.g. a cached result."""
+    shaper = ResultShaper(columns, **kwargs)
+    shaper.feed(rows)
+    return shaper
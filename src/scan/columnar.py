@@ -0,0 +1,150 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+FINDING_COLUMNS = [
+    "type", "id", "resource_name", "service_name", "avdid", "title", "description",
+    "resolution", "severity", "message", "cause_metadata",
+]
+
+# Grouping keys of the Kubernetes report view; one row per check and kind
+K8S_GROUP_KEYS = ["kind", "type", "id", "avdid", "title", "description", "resolution", "severity"]
+K8S_DETAIL_COLUMNS = ["resource_name", "message", "cause_metadata"]
+
+def get_purl_or_pkgid(data):
+    # Check if 'PkgIdentifier' and 'PURL' exist and are not empty
+    if 'PkgIdentifier' in data and 'PURL' in data['PkgIdentifier'] and data['PkgIdentifier']['PURL']:
+        return data['PkgIdentifier']['PURL']
+    else:
+        return data['PkgID']
+
+class FindingColumns:
+    """
+    Findings accumulated as one Python list per column instead of one dict per row.
+
+    The streaming import and the whole-report process_* helpers both extract findings
+    through it. cause_metadata is kept as the parsed report object and only serialized to
+    JSON by to_frame(), after deduplication, so dropped rows are never serialized.
+    """
+
+    def __init__(self, extra_columns: tuple = ()):
+        # Same column order as the dict rows of the report helpers
+        self.names = FINDING_COLUMNS[:-1] + list(extra_columns) + ["cause_metadata"]
+        self.columns = {name: [] for name in self.names}
+
+    def __len__(self):
+        return len(self.columns["type"])
+
+    def extend_k8s_resource(self, resource: dict, exclude_metadata: bool = True):
+        name = resource["Name"]
+        kind = resource.get("Kind", "")
+        c = self.columns
+        for result in resource.get("Results", []):
+            if result["MisconfSummary"]["Failures"] <= 0:
+                continue
+            misconfs = result.get("Misconfigurations", [])
+            if not misconfs:
+                continue
+            count = len(misconfs)
+            c["type"].extend(["KUBERNETES"] * count)
+            c["resource_name"].extend([name] * count)
+            c["service_name"].extend(["general"] * count)
+            c["id"].extend([m["ID"] for m in misconfs])
+            c["avdid"].extend([m["AVDID"] for m in misconfs])
+            c["title"].extend([m["Title"] for m in misconfs])
+            c["description"].extend([m["Description"] for m in misconfs])
+            c["resolution"].extend([m["Resolution"] for m in misconfs])
+            c["severity"].extend([m["Severity"] for m in misconfs])
+            c["message"].extend([m["Message"] for m in misconfs])
+            c["cause_metadata"].extend(["{}"] * count if exclude_metadata else [m.get("CauseMetadata", {}) for m in misconfs])
+            if "kind" in c:
+                c["kind"].extend([kind] * count)
+
+    def extend_aws_result(self, result: dict):
+        c = self.columns
+        for misconfig in result.get("Misconfigurations", []):
+            cause_metadata = misconfig.get("CauseMetadata", {})
+            c["type"].append("AWS")
+            c["id"].append(misconfig.get("ID", ""))
+            c["resource_name"].append(cause_metadata.get("Resource") or "{}_{}".format(
+                cause_metadata.get("Provider", ""),
+                cause_metadata.get("Service", ""),
+            ))
+            c["service_name"].append(cause_metadata.get("Service", ""))
+            c["avdid"].append(misconfig.get("AVDID", ""))
+            c["title"].append(misconfig.get("Title", ""))
+            c["description"].append(misconfig.get("Description", ""))
+            c["resolution"].append(misconfig.get("Resolution", ""))
+            c["severity"].append(misconfig.get("Severity", ""))
+            c["message"].append(misconfig.get("Message", ""))
+            c["cause_metadata"].append(cause_metadata)
+
+    def extend_code_result(self, result: dict, type: str = "CODE"):
+        c = self.columns
+        target = result.get("Target", "")
+        service_name = result.get("ServiceName", "general")
+        # A package used by several monorepo sub-projects is one finding per project
+        prefix = f"{result['Project']}:" if result.get("Project") else ""
+        for vul in result.get("Vulnerabilities", []):
+            risk_score = None
+            cvss_strings = None
+            cvss = vul.get("CVSS")
+            if cvss:
+                for source in ("nvd", "ghsa", "redhat"):
+                    if source in cvss:
+                        risk_score = cvss[source].get("V3Score", 0)
+                        cvss_strings = cvss[source].get("V3Vector", "")
+                        break
+            c["type"].append(type)
+            c["id"].append(vul.get("VulnerabilityID", ""))
+            c["resource_name"].append(prefix + get_purl_or_pkgid(vul))
+            c["service_name"].append(service_name)
+            c["avdid"].append("")
+            c["title"].append(vul.get("Title", ""))
+            c["description"].append(vul.get("Description", ""))
+            c["resolution"].append(f"Update to {vul.get('FixedVersion', 'NA')}")
+            c["severity"].append(vul.get("Severity", ""))
+            c["message"].append("")
+            c["cvss_strings"].append(cvss_strings)
+            c["risk_score"].append(risk_score)
+            # The scan target is already a string
+            c["cause_metadata"].append(target)
+
+    def to_frame(self, dedup_subset: list = None) -> pd.DataFrame:
+        """
+        Build the DataFrame, optionally keeping the first row per dedup_subset, and serialize
+        the remaining cause_metadata objects.
+        """
+        data = {name: self.columns[name] for name in self.names[:-1]}
+        df = pd.DataFrame(data, columns=self.names[:-1])
+        metadata = self.columns["cause_metadata"]
+        if dedup_subset and len(df):
+            keep = ~df.duplicated(subset=dedup_subset).to_numpy()
+            df = df[keep].reset_index(drop=True)
+            metadata = [m for m, k in zip(metadata, keep) if k]
+        df["cause_metadata"] = [m if isinstance(m, str) else json.dumps(m) for m in metadata]
+        return df
+
+def group_findings(df: pd.DataFrame, keys: list = K8S_GROUP_KEYS, detail_columns: list = K8S_DETAIL_COLUMNS) -> pd.DataFrame:
+    """
+    Group findings by keys with a Details column listing {resource_name, message,
+    cause_metadata} per grouped row, without a Python callback per group.
+
+    Rows are ordered by group code once, then the detail records are sliced at the group
+    boundaries. Rows with a missing key are dropped, like groupby does.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=keys + ["Details"])
+    codes = df.groupby(keys, sort=True).ngroup().to_numpy()
+    valid = codes >= 0
+    codes = codes[valid]
+    order = np.argsort(codes, kind="stable")
+    ordered = df[valid].iloc[order]
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    ends = np.r_[starts[1:], len(sorted_codes)]
+    records = [dict(zip(detail_columns, values)) for values in zip(*(ordered[c].tolist() for c in detail_columns))]
+    grouped = ordered.iloc[starts][keys].reset_index(drop=True)
+    grouped["Details"] = [records[start:end] for start, end in zip(starts, ends)]
+    return grouped
@@ -1,5 +1,7 @@
 import os
 import json
+import time
+import random
 from typing import Optional
 import yaml
 import asyncio
@@ -7,7 +9,10 @@ import csv
 from langchain_openai import ChatOpenAI
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 
-from src.utils.utils import reasoning_prompt, load_chat_model, read_file_prompt
+from src.utils.utils import load_chat_model
+from src.utils.prompts import prompt_registry
+from src.db.config import DEFAULT_DB_PATH
+from src.db.cvss_cache import CVSSCache
 
 import pandas as pd
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
@@ -15,13 +20,32 @@ from cvss import CVSS2, CVSS3, CVSS4
 
 model = load_chat_model()
 
+# Scoring engine settings
+CVSS_CONCURRENCY = int(os.environ.get("CVSS_CONCURRENCY", "8"))
+CVSS_RATE_LIMIT = float(os.environ.get("CVSS_RATE_LIMIT", "4"))  # requests per second
+CVSS_RATE_BURST = int(os.environ.get("CVSS_RATE_BURST", str(CVSS_CONCURRENCY)))
+CVSS_MAX_RETRIES = int(os.environ.get("CVSS_MAX_RETRIES", "5"))
+CVSS_TIMEOUT = float(os.environ.get("CVSS_TIMEOUT", "120"))  # seconds per row
+CVSS_BACKOFF_BASE = float(os.environ.get("CVSS_BACKOFF_BASE", "1"))
+CVSS_BACKOFF_MAX = float(os.environ.get("CVSS_BACKOFF_MAX", "60"))
+
+CVSS_CACHE_ENABLED = os.environ.get("CVSS_CACHE", "1") != "0"
+
+ISSUE_SCORING_PROMPT_PATH = "./src/prompts/issue_scoring_prompt.txt"
+CYBERSECURITY_SYSTEM_PROMPT_PATH = "./src/prompts/cybersecurity_system_prompt.txt"
+
+SCORE_COLUMNS = ["avdid", "title", "description", "resolution", "severity", "message"]
+
+async def _invoke_cvss(row):
+    content = prompt_registry.format(ISSUE_SCORING_PROMPT_PATH, ISSUE_DESCRIPTION=json.dumps(row.to_dict()))
+    local_messages = SystemMessage(content=prompt_registry.text(CYBERSECURITY_SYSTEM_PROMPT_PATH)), HumanMessage(content=content)
+    response = await model.ainvoke(local_messages)
+    return response.content
+
 # Function to generate CVSS strings asynchronously
 async def generate_cvss(row):
     try:
-        content = reasoning_prompt("./src/prompts/issue_scoring_prompt.txt", ISSUE_DESCRIPTION=json.dumps(row.to_dict()))
-        local_messages = SystemMessage(content=read_file_prompt("./src/prompts/cybersecurity_system_prompt.txt")), HumanMessage(content=content)
-        response = await model.ainvoke(local_messages)
-        return response.content
+        return await _invoke_cvss(row)
     except Exception as e:
         print(f"Error generating CVSS string for row: {row.to_dict()}. Error: {e}")
         return None
@@ -33,3 +57,150 @@ def safe_cvss_score(cvss_string):
     except Exception as e:
         print(f"Error processing CVSS string: {cvss_string}. Error: {e}")
         return None
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Return True if the error is a HTTP 429 / rate limit response from the model endpoint."""
+    if type(error).__name__ == "RateLimitError":
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+class TokenBucket:
+    """
+    Async token bucket limiting how many requests are started per second.
+
+    :param rate: Tokens added per second. A rate <= 0 disables limiting.
+    :param capacity: Maximum number of tokens (burst size).
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class CVSSScoringEngine:
+    """
+    Fan out generate_cvss calls with a concurrency limit, token bucket rate limiting,
+    retry with exponential backoff on 429 responses and a timeout per row.
+    """
+    def __init__(
+        self,
+        concurrency: int = CVSS_CONCURRENCY,
+        rate_limit: float = CVSS_RATE_LIMIT,
+        burst: int = CVSS_RATE_BURST,
+        max_retries: int = CVSS_MAX_RETRIES,
+        timeout: float = CVSS_TIMEOUT,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate_limit, burst)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(CVSS_BACKOFF_MAX, CVSS_BACKOFF_BASE * (2 ** attempt))
+        return delay + random.uniform(0, delay / 2)
+
+    async def score_row(self, row, semaphore: asyncio.Semaphore) -> Optional[str]:
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire()
+                try:
+                    return await asyncio.wait_for(_invoke_cvss(row), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    print(f"Timeout generating CVSS string for {row.get('avdid')} (attempt {attempt + 1})")
+                except Exception as e:
+                    if not is_rate_limit_error(e):
+                        print(f"Error generating CVSS string for row: {row.to_dict()}. Error: {e}")
+                        return None
+                    print(f"Rate limited while scoring {row.get('avdid')} (attempt {attempt + 1})")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._backoff(attempt))
+            print(f"Giving up on CVSS string for {row.get('avdid')} after {self.max_retries + 1} attempts")
+            return None
+
+    async def generate(self, rows: pd.DataFrame) -> list:
+        """
+        Generate CVSS strings for every row, preserving row order.
+
+        :param rows: DataFrame of findings to score.
+        :return: A list of CVSS strings (None where scoring failed).
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [self.score_row(row, semaphore) for _, row in rows.iterrows()]
+        return await asyncio.gather(*tasks)
+
+def scoring_version() -> str:
+    """Version of the scoring prompts, changing whenever one of them is edited."""
+    return prompt_registry.version(ISSUE_SCORING_PROMPT_PATH, CYBERSECURITY_SYSTEM_PROMPT_PATH)
+
+_cvss_cache = None
+
+def get_cvss_cache(db_path: str = DEFAULT_DB_PATH) -> Optional[CVSSCache]:
+    """
+    Return the process wide CVSS cache, versioned by the scoring prompts. None when disabled.
+    """
+    global _cvss_cache
+    if not CVSS_CACHE_ENABLED:
+        return None
+    version = scoring_version()
+    if _cvss_cache is None or _cvss_cache.database_path != db_path or _cvss_cache.version != version:
+        _cvss_cache = CVSSCache(version, database_path=db_path)
+    return _cvss_cache
+
+async def gen_cvss_scores(df: pd.DataFrame, engine: Optional[CVSSScoringEngine] = None, cache: Optional[CVSSCache] = None) -> pd.DataFrame:
+    """
+    Score each distinct AVDID in a findings DataFrame, reusing cached vectors where possible.
+
+    :param df: Findings DataFrame containing the SCORE_COLUMNS.
+    :param engine: Optional scoring engine; a default one is created when omitted.
+    :param cache: Optional CVSS cache; the process wide cache is used when omitted.
+    :return: DataFrame with one row per AVDID plus cvss_strings and risk_score columns.
+    """
+    engine = engine or CVSSScoringEngine()
+    cache = cache or get_cvss_cache()
+    sub_df = df[SCORE_COLUMNS].drop_duplicates(subset=["avdid"]).copy()
+    sub_df["cvss_strings"] = None
+    sub_df["risk_score"] = None
+
+    if cache is None:
+        pending = sub_df
+    else:
+        keys = [cache.make_key(row) for row in sub_df.to_dict(orient="records")]
+        sub_df["cache_key"] = keys
+        cached = cache.get_many(keys)
+        hit = sub_df["cache_key"].isin(list(cached))
+        sub_df.loc[hit, "cvss_strings"] = sub_df.loc[hit, "cache_key"].map(lambda k: cached[k][0])
+        sub_df.loc[hit, "risk_score"] = sub_df.loc[hit, "cache_key"].map(lambda k: cached[k][1])
+        pending = sub_df[~hit]
+
+    if len(pending) > 0:
+        # Generate CVSS strings concurrently
+        cvss_strings = await engine.generate(pending[SCORE_COLUMNS])
+        sub_df.loc[pending.index, "cvss_strings"] = cvss_strings
+        # Calculate CVSS scores
+        sub_df.loc[pending.index, "risk_score"] = [safe_cvss_score(c) for c in cvss_strings]
+
+    if cache is not None:
+        scored = sub_df.loc[pending.index]
+        cache.put_many(zip(scored["cache_key"], scored["avdid"], scored["cvss_strings"], scored["risk_score"]))
+        print(f"CVSS cache: {cache.stats()}")
+        sub_df = sub_df.drop(columns=["cache_key"])
+
+    sub_df["risk_score"] = sub_df["risk_score"].astype(float)
+    return sub_df
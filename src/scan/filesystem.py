@@ -6,6 +6,8 @@ from prettytable import PrettyTable
 import pandas as pd
 
 from src.scan.util import run_command_and_read_output, get_severity, run_command_bg
+from src.scan.columnar import FindingColumns
+from src.scan.report_index import load_report_index, as_report_index
 
 FS_REPORT_PATH = "/tmp/trivy_code_full.json"
 
@@ -17,6 +19,9 @@ def scan_filesystem(
     ] = [],  # Scanners to use; defaults to vuln, secret, and misconfig
     severity_level: str = "HIGH",  # Minimum severity level to include in the report
     bg: bool = False,
+    load_report: bool = True,  # Parse the report into memory after the scan
+    skip_dirs: List[str] = [],  # Directories of the path not to scan
+    concurrent: bool = False,  # Other trivy processes run at once, see util.update_trivy_db
 ):
     ###chainlit###
     if not os.path.isdir(path):
@@ -46,172 +51,68 @@ def scan_filesystem(
         severity,  # Specify the severity levels to include
         path,  # Path to be scanned
     ]
+    for skip_dir in skip_dirs:
+        command[-1:-1] = ["--skip-dirs", skip_dir]
+    if concurrent:
+        # The DB is updated once beforehand and the scan cache kept in memory, trivy locks both
+        command[-1:-1] = ["--skip-db-update", "--skip-java-db-update", "--cache-backend", "memory"]
     print(command)
     # Run the command and return the parsed output
     if bg:
         result = run_command_bg(command)
     else:
-        result = run_command_and_read_output(command=command, output_file=report)
+        result = run_command_and_read_output(command=command, output_file=report, load=load_report)
     return result
 
 
 def get_filesystem_report():
-    with open(FS_REPORT_PATH, "r") as file:
-        try:
-            return json.load(file)
-        except json.JSONDecodeError:
-            raise JSONParseError(output_file)
+    return load_report_index(FS_REPORT_PATH).report
 
 
 def get_filesystem_summary_yaml():
 
     output = {}
 
-    report = get_filesystem_report()
-    for item in report["Results"]:
-        target = item["Target"]
-        #Vulnerabilities
-        if "Vulnerabilities" in item:
-            output[target] = {}
-            output[target]["Vulnerabilities"] = []
-            for vul in item["Vulnerabilities"]:
-                vid = vul["VulnerabilityID"]
-                iv = vul["InstalledVersion"]
-                if "FixedVersion" in vul:
-                    fv = vul["FixedVersion"]
-                else:
-                    fv = "NA"
-                pkg = vul["PkgName"]
-                severity = vul["Severity"]
-                title = vul["Title"]
-                desc = vul["Description"]
-                if "CVSS" in vul:
-                    if "nvd" in vul["CVSS"]:
-                        cvss = vul["CVSS"]["nvd"]["V3Score"]
-                    elif "ghsa" in vul["CVSS"]:
-                        cvss = vul["CVSS"]["ghsa"]["V3Score"]
-                    elif "redhat" in vul["CVSS"]:
-                        cvss = vul["CVSS"]["redhat"]["V3Score"]
-                    else:
-                        cvss = 0
-                else:
-                    cvss = 0
-                output[target]["Vulnerabilities"].append({"VulID": vid, "Severity": severity, "Package": pkg, "Score": cvss, "Install Ver": iv, "Fixed Ver": fv, "Title": title})
-    
+    index = load_report_index(FS_REPORT_PATH)
+    for target, rows in index.vulnerabilities.items():
+        output[target] = {"Vulnerabilities": [
+            {"VulID": vid, "Severity": severity, "Package": pkg, "Score": cvss, "Install Ver": iv, "Fixed Ver": fv, "Title": title}
+            for vid, severity, pkg, iv, fv, cvss, title in rows
+        ]}
+
     return output
 
 def get_filesystem_summary_table():
     table = PrettyTable()
     table.field_names = ["ID", "Severity", "Package", "Cur Ver.", "Fixed Ver.", "CVSS", "title"]
-
-    report = get_filesystem_report()
-    for item in report["Results"]:
-        target = item["Target"]
-        #Vulnerabilities
-        if "Vulnerabilities" in item:
-            for vul in item["Vulnerabilities"]:
-                vid = vul["VulnerabilityID"]
-                iv = vul["InstalledVersion"]
-                if "FixedVersion" in vul:
-                    fv = vul["FixedVersion"]
-                else:
-                    fv = "NA"
-                pkg = vul["PkgName"]
-                severity = vul["Severity"]
-                title = vul["Title"]
-                desc = vul["Description"]
-                if "CVSS" in vul:
-                    if "nvd" in vul["CVSS"]:
-                        cvss = vul["CVSS"]["nvd"]["V3Score"]
-                    elif "ghsa" in vul["CVSS"]:
-                        cvss = vul["CVSS"]["ghsa"]["V3Score"]
-                    elif "redhat" in vul["CVSS"]:
-                        cvss = vul["CVSS"]["redhat"]["V3Score"]
-                    else:
-                        cvss = 0
-                else:
-                    cvss = 0
-                table.add_row([vid, severity, pkg, iv, fv, cvss, title])
+    table.add_rows(load_report_index(FS_REPORT_PATH).vulnerability_rows())
     return table.get_string()
 
-def code_footprint(report: dict, output_format="table"):
+def code_footprint(report, output_format="table"):
     """
     Generate a report of vulnerabilities in the specified output format.
     
     Parameters:
-        report (dict): The input report containing vulnerability details.
+        report (dict or ReportIndex): The input report containing vulnerability details.
         output_format (str): The output format, either "table" for PrettyTable or "dataframe" for pandas DataFrame.
     
     Returns:
         str or pandas.DataFrame: The vulnerability report in the selected format.
     """
-    table = PrettyTable()
-    table.field_names = ["ID", "Severity", "Package", "Cur Ver.", "Fixed Ver.", "CVSS", "Title"]
-    rows = []
-
-    for item in report.get("Results", []):
-        if "Vulnerabilities" in item:
-            for vul in item["Vulnerabilities"]:
-                vid = vul.get("VulnerabilityID", "NA")
-                iv = vul.get("InstalledVersion", "NA")
-                fv = vul.get("FixedVersion", "NA")
-                pkg = vul.get("PkgName", "NA")
-                severity = vul.get("Severity", "NA")
-                title = vul.get("Title", "NA")
-                cvss = 0
-                if "CVSS" in vul:
-                    cvss = vul["CVSS"].get("nvd", {}).get("V3Score", 0) or \
-                           vul["CVSS"].get("ghsa", {}).get("V3Score", 0) or \
-                           vul["CVSS"].get("redhat", {}).get("V3Score", 0)
-                row = [vid, severity, pkg, iv, fv, cvss, title]
-                table.add_row(row)
-                rows.append(row)
+    rows = as_report_index(report).vulnerability_rows()
 
     if output_format == "table":
+        table = PrettyTable()
+        table.field_names = ["ID", "Severity", "Package", "Cur Ver.", "Fixed Ver.", "CVSS", "Title"]
+        table.add_rows(rows)
         return table.get_string()
     elif output_format == "dataframe":
         return pd.DataFrame(rows, columns=["ID", "Severity", "Package", "Cur Ver.", "Fixed Ver.", "CVSS", "Title"])
     else:
         raise ValueError("Invalid output_format. Choose 'table' or 'dataframe'.")
 
-def get_purl_or_pkgid(data):
-    # Check if 'PkgIdentifier' and 'PURL' exist and are not empty
-    if 'PkgIdentifier' in data and 'PURL' in data['PkgIdentifier'] and data['PkgIdentifier']['PURL']:
-        return data['PkgIdentifier']['PURL']
-    else:
-        return data['PkgID']
-
 async def process_code_scan(report: dict, type="CODE"):
-    data = []
+    columns = FindingColumns(extra_columns=("cvss_strings", "risk_score"))
     for result in report["Results"]:
-        target = result.get("Target", "")
-        vulnerabilities = result.get("Vulnerabilities", [])
-        for vul in vulnerabilities:
-            if "CVSS" in vul:
-                if "nvd" in vul["CVSS"]:
-                    risk_score = vul["CVSS"]["nvd"].get("V3Score", 0)
-                    cvss_strings = vul["CVSS"]["nvd"].get("V3Vector", "")
-                elif "ghsa" in vul["CVSS"]:
-                    risk_score = vul["CVSS"]["ghsa"].get("V3Score", 0)
-                    cvss_strings = vul["CVSS"]["ghsa"].get("V3Vector", "")
-                elif "redhat" in vul["CVSS"]:
-                    risk_score = vul["CVSS"]["redhat"].get("V3Score", 0)
-                    cvss_strings = vul["CVSS"]["redhat"].get("V3Vector", "")
-            data.append({
-                "type": type,
-                "id": vul.get("VulnerabilityID", ""),
-                "resource_name": get_purl_or_pkgid(vul),
-                "service_name": "general",
-                "avdid": "",
-                "title": vul.get("Title", ""),
-                "description": vul.get("Description", ""),
-                "resolution": f"Update to {vul.get('FixedVersion', 'NA')}",
-                "severity": vul.get("Severity", ""),
-                "message": "",
-                "cvss_strings": cvss_strings,
-                "risk_score": risk_score,
-                "cause_metadata": target
-            })
-
-    df = pd.DataFrame(data)
-    return df
+        columns.extend_code_result(result, type)
+    return columns.to_frame()
@@ -19,6 +19,7 @@ def scan_image(
     ] = [],  # Scanners to use; defaults to vuln, secret, and misconfig
     severity_level: str = "HIGH",  # Minimum severity level to include in the report
     bg: bool = False,  # Run the scan in the background (default: False)
+    load_report: bool = True,  # Parse the report into memory after the scan
 ):
     ###chainlit###
     if not os.path.exists(image_path):
@@ -53,7 +54,7 @@ def scan_image(
     if bg:
         result = run_command_bg(command)
     else:
-        result = run_command_and_read_output(command=command, output_file=report)
+        result = run_command_and_read_output(command=command, output_file=report, load=load_report)
     return result
 
 def read_image_full_report():
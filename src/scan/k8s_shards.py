@@ -0,0 +1,262 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+import yaml
+
+from src.scan.kubernetes import scan_kubernetes
+from src.scan.util import update_trivy_db
+from src.scan.report_stream import iter_report_entries, TrivyReportReader
+
+# Trivy processes run at once in a sharded kubernetes scan
+K8S_SHARD_WORKERS = int(os.environ.get("K8S_SHARD_WORKERS", "4"))
+# Namespaces scanned by one Trivy process
+K8S_NAMESPACES_PER_SHARD = int(os.environ.get("K8S_NAMESPACES_PER_SHARD", "1"))
+# Trivy timeout of one shard
+K8S_SHARD_TIMEOUT = os.environ.get("K8S_SHARD_TIMEOUT", "30m")
+# Extra attempts of a failed shard within the same run
+K8S_SHARD_RETRIES = int(os.environ.get("K8S_SHARD_RETRIES", "1"))
+
+# Shard of the cluster-scoped resources (nodes, cluster roles, ...); namespace names cannot
+# contain "_"
+CLUSTER_SHARD = "_cluster"
+SHARD_PREFIX = "shard-"
+# Cluster-scoped kinds trivy reports on. The namespace filters do not apply to them, so the
+# namespace shards exclude them and only the cluster shard reports them.
+CLUSTER_SCOPED_KINDS = [
+    "node", "namespace", "clusterrole", "clusterrolebinding", "persistentvolume",
+    "storageclass", "ingressclass", "customresourcedefinition", "podsecuritypolicy",
+    "mutatingwebhookconfiguration", "validatingwebhookconfiguration",
+]
+
+class ShardScanError(Exception):
+    """Exception raised when shards of a sharded kubernetes scan failed."""
+    def __init__(self, shards):
+        self.shards = shards
+        self.message = f"{len(shards)} kubernetes shards failed: {', '.join(shards)}. Rerun with --retry-failed to rescan only them."
+        super().__init__(self.message)
+
+def list_namespaces(config_path: str) -> list:
+    """
+    Namespaces of the cluster of the kubeconfig current context, listed with kubectl. When
+    kubectl is unavailable the namespaces named by the kubeconfig contexts are used.
+
+    :param config_path: Path to the kubeconfig.
+    :return: The sorted namespace names.
+    """
+    try:
+        output = subprocess.run(
+            ["kubectl", "--kubeconfig", config_path, "get", "namespaces", "-o", "jsonpath={.items[*].metadata.name}"],
+            capture_output=True, check=True, text=True, timeout=60,
+        ).stdout
+        return sorted(output.split())
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Error listing namespaces with kubectl, using the kubeconfig contexts: {e}")
+    with open(config_path, "r") as file:
+        kubeconfig = yaml.safe_load(file) or {}
+    return sorted({
+        context.get("context", {}).get("namespace", "default")
+        for context in kubeconfig.get("contexts", [])
+    })
+
+def plan_shards(namespaces: list, per_shard: int = K8S_NAMESPACES_PER_SHARD) -> list:
+    """
+    Split the namespaces into shards of per_shard namespaces, plus one shard excluding every
+    namespace so the cluster-scoped resources are scanned exactly once.
+
+    :param namespaces: The namespace names.
+    :param per_shard: Namespaces scanned by one Trivy process.
+    :return: The shards as {"name", "include", "exclude", "exclude_kinds"} dicts.
+    """
+    per_shard = max(1, per_shard)
+    shards = []
+    for i in range(0, len(namespaces), per_shard):
+        group = namespaces[i:i + per_shard]
+        name = group[0] if per_shard == 1 else f"group-{i // per_shard:03d}"
+        shards.append({"name": name, "include": group, "exclude": [], "exclude_kinds": list(CLUSTER_SCOPED_KINDS)})
+    shards.append({"name": CLUSTER_SHARD, "include": [], "exclude": list(namespaces), "exclude_kinds": []})
+    return shards
+
+class ShardManifest:
+    """
+    The shards of the last sharded kubernetes scan and the outcome of each, saved as JSON
+    after every shard so a failed or interrupted scan can be resumed.
+
+    :param path: Path of the manifest file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.shards = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ShardManifest"]:
+        if not os.path.exists(path):
+            return None
+        manifest = cls(path)
+        with open(path, "r") as file:
+            manifest.shards = json.load(file).get("shards", [])
+        return manifest
+
+    def update(self, shard: dict, **fields):
+        """Update a shard and save the manifest, both under the lock so a dump never sees a shard half updated."""
+        with self._lock:
+            shard.update(fields)
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"shards": self.shards}, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def failed(self) -> list:
+        return [shard for shard in self.shards if shard.get("status") != "ok"]
+
+    def report_names(self) -> list:
+        """Names of the shards with a report, in manifest order."""
+        return [shard["name"] for shard in self.shards if shard.get("report")]
+
+def run_shard(shard: dict, report: str, config_path: str, retries: int = K8S_SHARD_RETRIES, timeout: str = K8S_SHARD_TIMEOUT) -> dict:
+    """
+    Scan one shard. The report is written next to its final path and moved there only on
+    success, so the last good report of a failing shard is kept. The shard itself is not
+    modified, as the manifest may be saved by other workers meanwhile.
+
+    :param shard: The shard to scan.
+    :param report: Final path of the shard report.
+    :param config_path: Path to the kubeconfig.
+    :param retries: Extra attempts after a failure.
+    :param timeout: Trivy timeout of the shard.
+    :return: The status, attempts, error, report and duration fields to update the shard with.
+    """
+    tmp_report = report + ".partial"
+    start = time.monotonic()
+    outcome = {"attempts": shard.get("attempts", 0)}
+    for attempt in range(retries + 1):
+        outcome["attempts"] += 1
+        try:
+            scan_kubernetes(
+                report=tmp_report,
+                config_path=config_path,
+                load_report=False,
+                include_namespaces=shard["include"],
+                exclude_namespaces=shard["exclude"],
+                # Manifests written before the kind filter have no exclude_kinds
+                exclude_kinds=shard.get("exclude_kinds", [] if shard["name"] == CLUSTER_SHARD else CLUSTER_SCOPED_KINDS),
+                timeout=timeout,
+                concurrent=True,
+            )
+            os.replace(tmp_report, report)
+            outcome.update(status="ok", error=None, report=os.path.basename(report))
+            break
+        except Exception as e:
+            outcome.update(status="failed", error=str(e))
+            print(f"[k8s shard {shard['name']}] attempt {attempt + 1} failed: {e}")
+    if os.path.exists(tmp_report):
+        os.remove(tmp_report)
+    outcome["duration"] = round(time.monotonic() - start, 1)
+    return outcome
+
+def scan_kubernetes_sharded(config_path: str, report_path: Callable[[str], str], manifest_path: str,
+                            workers: int = K8S_SHARD_WORKERS, per_shard: int = K8S_NAMESPACES_PER_SHARD,
+                            retry_failed: bool = False) -> ShardManifest:
+    """
+    Scan a cluster one namespace shard at a time on a bounded worker pool.
+
+    :param config_path: Path to the kubeconfig.
+    :param report_path: Maps a shard name to the path of its report.
+    :param manifest_path: Path of the shard manifest.
+    :param workers: Shards scanned at once.
+    :param per_shard: Namespaces scanned by one Trivy process.
+    :param retry_failed: Only rescan the shards that failed in the last run.
+    :return: The manifest of the scan.
+    """
+    previous = ShardManifest.load(manifest_path)
+    if retry_failed and previous is not None:
+        manifest = previous
+        pending = manifest.failed()
+    else:
+        manifest = ShardManifest(manifest_path)
+        manifest.shards = plan_shards(list_namespaces(config_path), per_shard)
+        # A shard keeps its last good report until it is scanned again
+        reports = {shard["name"]: shard["report"] for shard in previous.shards if shard.get("report")} if previous else {}
+        for shard in manifest.shards:
+            if shard["name"] in reports:
+                shard["report"] = reports.pop(shard["name"])
+        # Reports of shards that are no longer planned would be merged on import
+        for name in reports:
+            if os.path.exists(report_path(name)):
+                os.remove(report_path(name))
+        pending = manifest.shards
+    manifest.save()
+    if pending:
+        update_trivy_db()
+    print(f"Scanning {len(pending)} of {len(manifest.shards)} kubernetes shards with {workers} workers")
+
+    def scan(shard: dict):
+        manifest.update(shard, **run_shard(shard, report_path(shard["name"]), config_path))
+        print(f"[k8s shard {shard['name']}] {shard['status']} in {shard['duration']}s")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(scan, pending))
+    return manifest
+
+def _unique_cluster_resources(entries: Iterator[dict], seen: set) -> Iterator[dict]:
+    # Cluster-scoped resources have no namespace and are yielded once across shard reports
+    for entry in entries:
+        if not entry.get("Namespace"):
+            key = (entry.get("Kind"), entry.get("Name"))
+            if key in seen:
+                continue
+            seen.add(key)
+        yield entry
+
+def iter_shard_entries(manifest_path: str, report_path: Callable[[str], str], key: str) -> Iterator[dict]:
+    """
+    Stream the entries of every shard report one after the other, one entry in memory at a
+    time. Shards without a report are skipped with a warning. A cluster-scoped resource is
+    only yielded once, should an older shard report contain it as well.
+
+    :param manifest_path: Path of the shard manifest.
+    :param report_path: Maps a shard name to the path of its report.
+    :param key: The top-level array to stream.
+    """
+    manifest = ShardManifest.load(manifest_path)
+    failed = [shard["name"] for shard in manifest.failed()]
+    if failed:
+        print(f"Warning: kubernetes shards without a fresh report: {', '.join(failed)}; retry them with --retry-failed")
+    seen = set()
+    for name in manifest.report_names():
+        path = report_path(name)
+        if not os.path.exists(path):
+            continue
+        yield from _unique_cluster_resources(iter_report_entries(path, key), seen)
+
+def merge_shard_reports(manifest_path: str, report_path: Callable[[str], str]) -> dict:
+    """
+    The shard reports merged into one report dict, for callers that need the whole report
+    in memory. The top-level fields are taken from the first shard report, and
+    cluster-scoped resources are kept once as in iter_shard_entries.
+    """
+    manifest = ShardManifest.load(manifest_path)
+    merged = {}
+    seen = set()
+    for name in manifest.report_names():
+        path = report_path(name)
+        if not os.path.exists(path):
+            continue
+        reader = TrivyReportReader(path, "Resources")
+        resources = list(_unique_cluster_resources(reader, seen))
+        for field, value in reader.header.items():
+            merged.setdefault(field, value)
+        merged.setdefault("Resources", []).extend(resources)
+    return merged
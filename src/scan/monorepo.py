@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from src.scan.filesystem import scan_filesystem
+from src.scan.report_stream import TrivyReportReader
+from src.scan.util import update_trivy_db
+
+# Trivy processes run at once in a monorepo scan
+CODE_SCAN_WORKERS = int(os.environ.get("CODE_SCAN_WORKERS", "4"))
+
+# Files that make a directory a sub-project
+PROJECT_MANIFESTS = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "package.json",
+    "go.mod", "go.sum",
+    "requirements.txt", "Pipfile.lock", "poetry.lock", "pyproject.toml", "setup.py",
+    "pom.xml", "build.gradle", "build.gradle.kts", "gradle.lockfile",
+    "Cargo.lock", "Cargo.toml", "Gemfile.lock", "composer.lock", "packages.lock.json",
+    "mix.lock", "pubspec.lock", "Package.resolved", "Podfile.lock", "conan.lock",
+}
+# Dependency, build and VCS directories are never searched for sub-projects
+IGNORED_DIRS = {
+    ".git", "node_modules", "vendor", ".venv", "venv", "__pycache__", ".tox",
+    "target", "dist", "build", ".terraform", ".gradle", ".idea",
+}
+ROOT_PROJECT = "."
+
+class MonorepoScanError(Exception):
+    """Exception raised when sub-projects of a monorepo scan failed."""
+    def __init__(self, projects):
+        self.projects = projects
+        self.message = f"{len(projects)} sub-project scans failed: {', '.join(projects)}"
+        super().__init__(self.message)
+
+def discover_projects(folder: str) -> List[dict]:
+    """
+    Find the sub-projects of a folder by their lockfiles and manifests.
+
+    Each project is scanned without its nested projects, and the root folder is always a
+    project so files outside of every sub-project (IaC, Dockerfiles, secrets) are scanned.
+
+    :param folder: The monorepo folder.
+    :return: Projects as {"name", "path", "skip_dirs"} dicts, name being the path relative
+             to folder and skip_dirs the nested projects relative to the project.
+    """
+    names = [ROOT_PROJECT]
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS)
+        rel = os.path.relpath(dirpath, folder)
+        if rel != ROOT_PROJECT and PROJECT_MANIFESTS.intersection(filenames):
+            names.append(rel)
+
+    projects = []
+    for name in names:
+        prefix = "" if name == ROOT_PROJECT else name + os.sep
+        nested = [other for other in names if other != ROOT_PROJECT and other != name and other.startswith(prefix)]
+        # Only the outermost nested projects, their own children are inside them
+        outermost = [n for n in nested if not any(n.startswith(o + os.sep) for o in nested)]
+        projects.append({
+            "name": name,
+            "path": os.path.join(folder, name) if name != ROOT_PROJECT else folder,
+            "skip_dirs": [os.path.relpath(n, name) for n in outermost],
+        })
+    return projects
+
+def service_name(folder: str, project: str) -> str:
+    return os.path.basename(os.path.abspath(folder)) if project == ROOT_PROJECT else project
+
+def merge_reports(folder: str, reports: List[tuple], output: str):
+    """
+    Write the Results of the sub-project reports into one standard filesystem report,
+    one result at a time. Targets are prefixed with the project path and every result is
+    tagged with its project as ServiceName. Results of sub-projects also get their project
+    path as Project, which scopes their findings' resource names to the project.
+
+    :param folder: The monorepo folder.
+    :param reports: (project name, report path) pairs.
+    :param output: Path of the merged report.
+    """
+    tmp_output = output + ".partial"
+    with open(tmp_output, "w") as file:
+        header = {"SchemaVersion": 2, "ArtifactName": folder, "ArtifactType": "filesystem"}
+        file.write(json.dumps(header)[:-1] + ', "Results": [')
+        first = True
+        for project, path in reports:
+            for result in TrivyReportReader(path, "Results"):
+                if project != ROOT_PROJECT:
+                    result["Target"] = os.path.join(project, result.get("Target", ""))
+                    result["Project"] = project
+                result["ServiceName"] = service_name(folder, project)
+                file.write(("" if first else ",\n") + json.dumps(result))
+                first = False
+        file.write("]}\n")
+    os.replace(tmp_output, output)
+
+def scan_monorepo(folder: str, report: str, workers: int = CODE_SCAN_WORKERS, **kwargs) -> str:
+    """
+    Scan every sub-project of a monorepo with its own trivy fs process, at most workers at
+    once, and merge the reports into report.
+
+    :param folder: The monorepo folder.
+    :param report: Path of the merged report.
+    :param workers: Sub-projects scanned at once.
+    :param kwargs: Passed to scan_filesystem (scanners, severity_level).
+    :return: The path of the merged report.
+    :raises MonorepoScanError: If sub-projects failed; the previous report is kept.
+    """
+    if not os.path.isdir(folder):
+        print(f"Error: The folder '{folder}' does not exist.")
+        return False
+    projects = discover_projects(folder)
+    print(f"Scanning {len(projects)} sub-projects of {folder} with {workers} workers")
+    update_trivy_db(java_db=True)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(report) or None) as tmp:
+        def scan(index_project):
+            index, project = index_project
+            project_report = os.path.join(tmp, f"{index:04d}.json")
+            start = time.monotonic()
+            try:
+                if scan_filesystem(
+                    path=project["path"],
+                    report=project_report,
+                    load_report=False,
+                    skip_dirs=project["skip_dirs"],
+                    concurrent=True,
+                    **kwargs,
+                ) is False:
+                    raise FileNotFoundError(project["path"])
+                print(f"[{project['name']}] scanned in {time.monotonic() - start:.1f}s")
+                return project["name"], project_report, None
+            except Exception as e:
+                print(f"[{project['name']}] scan failed: {e}")
+                return project["name"], project_report, e
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(scan, enumerate(projects)))
+
+        failed = [name for name, _, error in results if error is not None]
+        if failed:
+            raise MonorepoScanError(failed)
+        merge_reports(folder, [(name, path) for name, path, _ in results], report)
+    return report
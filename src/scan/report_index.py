@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from typing import Union
+
+import yaml
+
+from src.scan.util import JSONParseError
+
+CVSS_SOURCES = ("nvd", "ghsa", "redhat")
+
+def cvss_score(vul: dict) -> float:
+    """V3 score of the first CVSS source that has one, 0 otherwise."""
+    cvss = vul.get("CVSS") or {}
+    for source in CVSS_SOURCES:
+        score = cvss.get(source, {}).get("V3Score", 0)
+        if score:
+            return score
+    return 0
+
+def cause_code(misconfiguration: dict) -> str:
+    lines = misconfiguration.get("CauseMetadata", {}).get("Code", {}).get("Lines")
+    if type(lines) != list:
+        return ""
+    return "".join(line["Content"] for line in lines)
+
+class ReportIndex:
+    """
+    A Trivy report parsed once and indexed for the report helpers.
+
+    - checks: the misconfigurations by AVDID, with the distinct resources they were found on
+    - resources: the positions in Resources of the k8s resources of each "Kind/Name";
+      names are only unique per namespace, so one "Kind/Name" can have several resources
+    - names: the distinct "Kind/Name" list in report order, and the sorted names of each
+      kind for prefix lookups
+    - vulnerabilities: the vulnerability rows of each fs/image target
+
+    Rendered outputs are memoized, the report does not change for the life of the index.
+
+    :param report: The parsed report.
+    """
+    def __init__(self, report: dict):
+        self.report = report
+        self.checks = {}
+        self.resources = {}
+        self.kinds = {}
+        self.names = []
+        self.vulnerabilities = {}
+        self._rendered = {}
+
+        for position, item in enumerate(report.get("Resources", [])):
+            full_name = f"{item['Kind']}/{item['Name']}"
+            if full_name not in self.resources:
+                self.names.append(full_name)
+                self.kinds.setdefault(item["Kind"], []).append(item["Name"])
+                self.resources[full_name] = []
+            self.resources[full_name].append(position)
+            for res in item.get("Results", []):
+                for mis in res.get("Misconfigurations", []):
+                    self._add_check(mis, full_name)
+
+        for res in report.get("Results", []):
+            for mis in res.get("Misconfigurations", []):
+                self._add_check(mis, mis.get("CauseMetadata", {}).get("Resource", ""))
+            if "Vulnerabilities" in res:
+                rows = self.vulnerabilities.setdefault(res.get("Target", ""), [])
+                for vul in res["Vulnerabilities"] or []:
+                    rows.append([
+                        vul.get("VulnerabilityID", "NA"),
+                        vul.get("Severity", "NA"),
+                        vul.get("PkgName", "NA"),
+                        vul.get("InstalledVersion", "NA"),
+                        vul.get("FixedVersion", "NA"),
+                        cvss_score(vul),
+                        vul.get("Title", "NA"),
+                    ])
+
+        self.sorted_kinds = {kind: sorted(names) for kind, names in self.kinds.items()}
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+    def _add_check(self, mis: dict, resource: str):
+        check = self.checks.get(mis["AVDID"])
+        if check is None:
+            check = self.checks[mis["AVDID"]] = {
+                "ID": mis["AVDID"], "Title": mis["Title"], "Description": mis["Description"],
+                "Resolution": mis["Resolution"], "Severity": mis["Severity"], "Resources": {},
+            }
+        # A dict keeps the distinct resources in first seen order
+        check["Resources"][resource] = None
+
+    def find_resources(self, pattern: str) -> list:
+        """
+        "Kind/Name" of the resources whose full name contains pattern, in report order.
+
+        A "Kind/Name" pattern can only match kinds ending with its kind part and names
+        starting with its name part, so it is answered from the sorted names of those kinds.
+        Other patterns scan the names.
+        """
+        key = ("find", pattern)
+        if key not in self._rendered:
+            kind, sep, name = pattern.partition("/")
+            if sep and "/" not in name:
+                matches = []
+                for candidate_kind, names in self.sorted_kinds.items():
+                    if not candidate_kind.endswith(kind):
+                        continue
+                    for candidate in names[bisect_left(names, name):]:
+                        if not candidate.startswith(name):
+                            break
+                        matches.append(f"{candidate_kind}/{candidate}")
+                matches.sort(key=self._positions.__getitem__)
+            else:
+                matches = [full_name for full_name in self.names if pattern in full_name]
+            self._rendered[key] = matches
+        return self._rendered[key]
+
+    def resource_details(self, pattern: str) -> list:
+        """Details of every resource whose full name contains pattern, in report order."""
+        positions = sorted(p for full_name in self.find_resources(pattern) for p in self.resources[full_name])
+        return [self.resource_detail(position) for position in positions]
+
+    def resource_detail(self, position: int) -> str:
+        """YAML detail of the resource at position in Resources."""
+        key = ("resource", position)
+        if key not in self._rendered:
+            item = self.report["Resources"][position]
+            detail = {"Name": f"{item['Kind']}/{item['Name']}", "Misconfigurations": []}
+            for res in item.get("Results", []):
+                for mis in res.get("Misconfigurations", []):
+                    detail["Misconfigurations"].append({
+                        "ID": mis["AVDID"], "Title": mis["Title"], "Description": mis["Description"],
+                        "Resolution": mis["Resolution"], "Severity": mis["Severity"], "Code": cause_code(mis),
+                    })
+            self._rendered[key] = yaml.dump(detail)
+        return self._rendered[key]
+
+    def check_summaries(self) -> list:
+        """One summary per AVDID, with the number of distinct resources it was found on."""
+        return [{**check, "Resources": len(check["Resources"])} for check in self.checks.values()]
+
+    def checks_yaml(self) -> str:
+        if "checks" not in self._rendered:
+            self._rendered["checks"] = "".join("\n\n" + yaml.dump(v) for v in self.check_summaries())
+        return self._rendered["checks"]
+
+    def vulnerability_rows(self) -> list:
+        return [row for rows in self.vulnerabilities.values() for row in rows]
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def load_report_index(path: str) -> ReportIndex:
+    """
+    The index of the report at path, parsed again only when the file's mtime or size changed.
+    The index and its report are shared, callers must not modify them.
+
+    :param path: Path to the Trivy JSON report.
+    :return: The ReportIndex of the report.
+    :raises JSONParseError: If the report is not valid JSON.
+    """
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    with open(path, "r") as file:
+        try:
+            report = json.load(file)
+        except json.JSONDecodeError:
+            raise JSONParseError(path)
+    index = ReportIndex(report)
+    with _cache_lock:
+        _cache[path] = (stamp, index)
+    return index
+
+def as_report_index(report: Union[dict, ReportIndex]) -> ReportIndex:
+    """Index a report dict, or return an existing index."""
+    if isinstance(report, ReportIndex):
+        return report
+    return ReportIndex(report)
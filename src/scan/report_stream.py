@@ -0,0 +1,133 @@
+import json
+from typing import Iterator, Optional
+
+from src.scan.util import JSONParseError
+
+STREAM_CHUNK_SIZE = 1 << 20
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789+-.eE"
+
+class TrivyReportReader:
+    """
+    Incremental reader for Trivy JSON reports.
+
+    Iterating the reader yields the entries of one top-level array (e.g. "Resources" for
+    `trivy k8s`, "Results" for `trivy fs`/`image`/`aws`) one at a time, so peak memory is
+    bounded by the largest single entry instead of the whole report. The other top-level
+    fields are collected into `header` as they are encountered.
+
+    :param path: Path to the Trivy JSON report.
+    :param key: Name of the top-level array to stream.
+    :param chunk_size: Number of characters read from the file at a time.
+    """
+    def __init__(self, path: str, key: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.path = path
+        self.key = key
+        self.chunk_size = chunk_size
+        self.header = {}
+        self._decoder = json.JSONDecoder()
+
+    def __iter__(self) -> Iterator[dict]:
+        with open(self.path, "r", encoding="utf-8") as file:
+            self._file = file
+            self._buf = ""
+            self._pos = 0
+            self._eof = False
+            yield from self._parse_object()
+
+    def read_header(self) -> dict:
+        """Read the top-level fields, skipping over the streamed array without keeping it."""
+        for _ in self:
+            pass
+        return self.header
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # Drop consumed input and grow the read size for large values
+        self._buf = self._buf[self._pos:]
+        self._pos = 0
+        data = self._file.read(max(self.chunk_size, len(self._buf)))
+        if not data:
+            self._eof = True
+            return False
+        self._buf += data
+        return True
+
+    def _peek(self) -> Optional[str]:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise JSONParseError(self.path)
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number followed only by number characters up to the buffer end may be
+                # truncated ("1." decodes as 1), so it is only accepted once a delimiter is read
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    tail = end
+                    while tail < len(self._buf) and self._buf[tail] in NUMBER_CHARS:
+                        tail += 1
+                    truncated = tail == len(self._buf)
+                else:
+                    truncated = end == len(self._buf)
+                if not truncated or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise JSONParseError(self.path)
+            self._fill()
+
+    def _parse_object(self) -> Iterator[dict]:
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if name == self.key and self._peek() == "[":
+                yield from self._parse_array()
+            else:
+                self.header[name] = self._value()
+            char = self._peek()
+            self._pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise JSONParseError(self.path)
+
+    def _parse_array(self) -> Iterator[dict]:
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            char = self._peek()
+            self._pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise JSONParseError(self.path)
+
+def iter_report_entries(path: str, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yield the entries of a top-level array in a Trivy JSON report one at a time.
+
+    :param path: Path to the Trivy JSON report.
+    :param key: Name of the top-level array ("Resources" or "Results").
+    :return: An iterator of the array entries.
+    """
+    return iter(TrivyReportReader(path, key, chunk_size=chunk_size))
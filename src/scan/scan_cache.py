@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import subprocess
+import tarfile
+import time
+from typing import Optional
+
+import yaml
+
+# Seconds a report of an unchanged target is reused; the vulnerability DB changes daily.
+# 0 always rescans.
+SCAN_CACHE_TTL = int(os.environ.get("SCAN_CACHE_TTL", "86400"))
+FINGERPRINT_TIMEOUT = int(os.environ.get("SCAN_FINGERPRINT_TIMEOUT", "60"))
+
+# Resources trivy k8s reports on. Nodes are left out, their status changes on every
+# heartbeat.
+K8S_FINGERPRINT_RESOURCES = (
+    "namespaces,pods,deployments,replicasets,daemonsets,statefulsets,jobs,cronjobs,"
+    "services,ingresses,networkpolicies,configmaps,serviceaccounts,roles,rolebindings,"
+    "clusterroles,clusterrolebindings"
+)
+K8S_FINGERPRINT_TEMPLATE = (
+    "jsonpath={range .items[*]}{.kind}|{.metadata.uid}|{.metadata.generation}|"
+    "{.metadata.resourceVersion}|{.metadata.ownerReferences[0].kind}{\"\\n\"}{end}"
+)
+
+def _digest(*parts) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _run(command: list) -> Optional[bytes]:
+    try:
+        return subprocess.run(command, capture_output=True, check=True, timeout=FINGERPRINT_TIMEOUT).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def folder_fingerprint(folder: str) -> Optional[str]:
+    """
+    Fingerprint of a code folder: its git tree at HEAD plus the state of modified, untracked
+    and ignored files, or an mtime/size manifest of every file when it is not a git work tree.
+
+    :param folder: The scanned folder.
+    :return: The fingerprint, or None if the folder does not exist.
+    """
+    if not os.path.isdir(folder):
+        return None
+    tree = _run(["git", "-C", folder, "rev-parse", "HEAD:./"])
+    # Trivy also scans gitignored files (vendored lockfiles, secrets), so they are listed too
+    status = _run(["git", "-C", folder, "status", "--porcelain=v1", "-z", "--untracked-files=all", "--ignored", "--", "."])
+    root = _run(["git", "-C", folder, "rev-parse", "--show-toplevel"])
+    if tree is not None and status is not None and root is not None:
+        root = root.decode().strip()
+        parts = [b"git", tree.strip(), status]
+        # Dirty files are fingerprinted by their current mtime and size
+        for entry in status.split(b"\0"):
+            path = os.path.join(root, entry[3:].decode(errors="replace")) if len(entry) > 3 else None
+            if path and os.path.isfile(path):
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+        return _digest(*parts)
+
+    h = hashlib.blake2b(digest_size=20)
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = sorted(d for d in dirnames if d != ".git")
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            h.update(f"{os.path.relpath(path, folder)}:{stat.st_mtime_ns}:{stat.st_size}\0".encode("utf-8"))
+    return "manifest:" + h.hexdigest()
+
+def image_fingerprint(image_path: str) -> Optional[str]:
+    """
+    Fingerprint of an image tar: the digest of its manifest (docker save manifest.json or
+    OCI index.json), which names the config and layer digests. Falls back to the tar's
+    mtime and size.
+
+    :param image_path: Path to the image tar.
+    :return: The fingerprint, or None if the image does not exist.
+    """
+    if not os.path.exists(image_path):
+        return None
+    try:
+        with tarfile.open(image_path) as tar:
+            for name in ("manifest.json", "index.json"):
+                try:
+                    member = tar.extractfile(name)
+                except KeyError:
+                    continue
+                if member is not None:
+                    return "sha256:" + hashlib.sha256(member.read()).hexdigest()
+    except (OSError, tarfile.TarError):
+        pass
+    stat = os.stat(image_path)
+    return _digest("file", stat.st_mtime_ns, stat.st_size)
+
+def kubernetes_fingerprint(config_path: str) -> Optional[str]:
+    """
+    Fingerprint of a cluster: the kubeconfig current context and its cluster server, plus
+    the spec version of every scanned resource. Status updates must not change it:
+    - resources with a metadata.generation (workloads) count by it, it only changes with the spec
+    - pods owned by a controller are left out, their spec comes from the controller
+    - other pods count by uid only, a pod spec is immutable
+    - the rest (config maps, RBAC, services) count by resourceVersion
+
+    :param config_path: Path to the kubeconfig.
+    :return: The fingerprint, or None if the kubeconfig is missing or kubectl fails.
+    """
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, "r") as file:
+        kubeconfig = yaml.safe_load(file) or {}
+    context_name = kubeconfig.get("current-context", "")
+    context = next((c.get("context", {}) for c in kubeconfig.get("contexts", []) if c.get("name") == context_name), {})
+    cluster = next((c.get("cluster", {}) for c in kubeconfig.get("clusters", []) if c.get("name") == context.get("cluster")), {})
+    listing = _run([
+        "kubectl", "--kubeconfig", config_path, "get", K8S_FINGERPRINT_RESOURCES, "--all-namespaces",
+        "--ignore-not-found", "-o", K8S_FINGERPRINT_TEMPLATE,
+    ])
+    if listing is None:
+        return None
+    versions = []
+    for line in listing.decode(errors="replace").splitlines():
+        kind, uid, generation, resource_version, owner = (line.split("|") + [""] * 5)[:5]
+        if kind == "Pod":
+            if owner:
+                continue
+            versions.append(uid)
+        elif generation:
+            versions.append(f"{uid}={generation}")
+        else:
+            versions.append(f"{uid}:{resource_version}")
+    return _digest(context_name, cluster.get("server", ""), "\n".join(sorted(versions)))
+
+def aws_fingerprint(region: str) -> str:
+    """
+    AWS accounts have no cheap change marker, so only the region and credentials identify
+    the target and the TTL decides when to rescan.
+    """
+    return _digest("aws", region, os.environ.get("AWS_ACCESS_KEY_ID", ""))
+
+def target_fingerprint(resource_type: str, config: dict) -> Optional[str]:
+    """
+    Fingerprint of the target of a scan config section. The section itself is part of it,
+    so changing scan settings rescans.
+
+    :param resource_type: 'code', 'container', 'kubernetes' or 'aws'.
+    :param config: The resource_type section of the scan config.
+    :return: The fingerprint, or None if the target cannot be fingerprinted.
+    """
+    if resource_type == "code":
+        target = folder_fingerprint(config["folder"])
+    elif resource_type == "container":
+        target = image_fingerprint(config["image_path"])
+    elif resource_type == "kubernetes":
+        target = kubernetes_fingerprint(config["config_path"])
+    elif resource_type == "aws":
+        target = aws_fingerprint(config["region"])
+    else:
+        return None
+    if target is None:
+        return None
+    return _digest(resource_type, json.dumps(config, sort_keys=True, default=str), target)
+
+class ScanCache:
+    """
+    Fingerprints of the targets the stored reports were produced from, kept in a
+    `<report>.fingerprint.json` file next to each report.
+
+    :param ttl: Seconds a report of an unchanged target is reused.
+    """
+    def __init__(self, ttl: int = SCAN_CACHE_TTL):
+        self.ttl = ttl
+
+    @staticmethod
+    def _entry_path(report_path: str) -> str:
+        return os.path.splitext(report_path)[0] + ".fingerprint.json"
+
+    def lookup(self, report_path: str, fingerprint: Optional[str]) -> bool:
+        """
+        Whether the report at report_path can be reused for a target with this fingerprint.
+
+        :param report_path: Path of the stored report.
+        :param fingerprint: The current target fingerprint, None if it could not be computed.
+        :return: True if the report exists, is younger than the TTL and was produced from
+                 the same fingerprint.
+        """
+        if fingerprint is None or self.ttl <= 0 or not os.path.exists(report_path):
+            return False
+        try:
+            with open(self._entry_path(report_path), "r") as file:
+                entry = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return False
+        return (
+            entry.get("fingerprint") == fingerprint
+            and entry.get("report_mtime_ns") == os.stat(report_path).st_mtime_ns
+            and time.time() - entry.get("scanned_at", 0) < self.ttl
+        )
+
+    def store(self, report_path: str, fingerprint: Optional[str]):
+        """Record the fingerprint of the target a new report was produced from."""
+        if fingerprint is None or not os.path.exists(report_path):
+            self.invalidate(report_path)
+            return
+        entry = {
+            "fingerprint": fingerprint,
+            "scanned_at": time.time(),
+            "report_mtime_ns": os.stat(report_path).st_mtime_ns,
+        }
+        tmp_path = self._entry_path(report_path) + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, self._entry_path(report_path))
+
+    def invalidate(self, report_path: str):
+        try:
+            os.remove(self._entry_path(report_path))
+        except FileNotFoundError:
+            pass
@@ -1,53 +1,239 @@
-from src.db.db_util import init_db, batch_upsert_records, query_all_records, export_to_csv
+from src.db.db_util import init_db, batch_upsert_records, bulk_upsert_records, query_all_records, export_to_csv, claim_import_keys, clear_import_keys, fetch_records_by_keys, delete_unclaimed_records, get_score_version, set_score_version, analyze_db, begin_import, bump_data_generation
 import asyncio
+import hashlib
+import json
+import math
+import os
+import pandas as pd
+import sqlite3
 from src.scan.scan_result import ScanResult
 from src.db.config import DEFAULT_DB_PATH
-from src.scan.kubernetes import gen_kubernetes_db_content
-from src.scan.filesystem import process_code_scan
-from src.scan.aws import gen_aws_db_content
+from src.scan.columnar import FindingColumns
+from src.scan.cvss_score import gen_cvss_scores, scoring_version
+from src.db.db_query import refresh_report_tables, REPORT_CATEGORIES
+from src.db.report_cache import ReportCache
+from src.core.report import generate_report, report_version
+from src.utils.utils import load_chat_model
 
-async def process_and_upsert_scan_results(scan_type: str, scan_result: ScanResult, db_cols: list, process_func=None, **kwargs):
+DB_COLS = ['type', 'id', 'resource_name', 'service_name', 'avdid', 'title', 'description', 'resolution', 'severity', 'message', 'cvss_strings', 'risk_score', 'cause_metadata']
+
+# Number of finding rows buffered before a chunk is scored and written
+IMPORT_CHUNK_ROWS = int(os.environ.get("IMPORT_CHUNK_ROWS", "5000"))
+
+# Generate the /report outputs for every category once an import has finished
+REPORT_PREGENERATE = os.environ.get("REPORT_PREGENERATE", "0") == "1"
+# Report generations started by finalize_import, kept referenced until they finish
+_background_tasks = set()
+
+# Streaming import settings per scan type: top-level report array, FindingColumns extractor, LLM scoring
+STREAM_IMPORTS = {
+    "kubernetes": ("Resources", lambda columns, entry: columns.extend_k8s_resource(entry, exclude_metadata=False), True),
+    "aws": ("Results", FindingColumns.extend_aws_result, True),
+    "code": ("Results", lambda columns, entry: columns.extend_code_result(entry, type="CODE"), False),
+    "container": ("Results", lambda columns, entry: columns.extend_code_result(entry, type="CONTAINER"), False),
+}
+
+# Finding content the CVSS vector is generated from; rows differing in it are scored separately
+SCORE_KEY_COLUMNS = ["avdid", "title", "description", "resolution", "severity"]
+
+def _seed_scores(stored_rows, scores: dict):
+    """Reuse the scores of stored findings, unless their scoring failed."""
+    for row in stored_rows:
+        if row["cvss_strings"] and row["risk_score"] is not None:
+            scores.setdefault(tuple(row[col] for col in SCORE_KEY_COLUMNS), (row["cvss_strings"], row["risk_score"]))
+
+async def _score_chunk(df: pd.DataFrame, scores: dict) -> pd.DataFrame:
+    """
+    Score the findings of a chunk whose content is not in scores through gen_cvss_scores,
+    whose cache is keyed by the finding content and the scoring prompt version. scores holds
+    the stored scores of the chunk and the findings scored by earlier chunks of the import.
+    """
+    content = list(zip(*(df[col] for col in SCORE_KEY_COLUMNS)))
+    pending = df[[key not in scores for key in content]]
+    if len(pending) > 0:
+        res = await gen_cvss_scores(pending)
+        for key, cvss_strings, risk_score in zip(zip(*(res[col] for col in SCORE_KEY_COLUMNS)), res["cvss_strings"], res["risk_score"]):
+            scores[key] = (cvss_strings, risk_score)
+    df["cvss_strings"] = [scores.get(key, (None, None))[0] for key in content]
+    df["risk_score"] = [scores.get(key, (None, None))[1] for key in content]
+    return df
+
+def finding_hash(record: dict, columns: list = DB_COLS) -> str:
+    """Hash the columns of a finding so unchanged rows can be skipped on re-import."""
+    values = [
+        None if isinstance(record.get(col), float) and math.isnan(record.get(col)) else record.get(col)
+        for col in columns
+    ]
+    return hashlib.sha256(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+
+async def stream_and_upsert_scan_results(scan_type: str, scan_result: ScanResult, db_cols: list, chunk_rows: int = IMPORT_CHUNK_ROWS, incremental: bool = True):
     """
-    Process scan results, generate database content, and upsert records.
+    Stream a Trivy report entry by entry, score and upsert findings in bounded chunks.
+
+    Every chunk is scored first, then diffed against the stored rows of its keys by
+    (type, id, resource_name) and a hash of all columns: new findings are inserted, changed
+    ones updated and unchanged ones skipped. A finding keeps its stored score when its
+    content is unchanged and the last import of the type used the same scoring prompts, so
+    only new or changed findings reach the scoring model. The keys seen by the import are recorded in the
+    import_keys table instead of memory, and in incremental mode the stored findings missing
+    from the report are deleted at the end.
 
     Args:
-        scan_type (str): The type of scan (e.g., "kubernetes", "aws").
+        scan_type (str): The type of scan (e.g., "kubernetes", "aws", "code", "container").
         scan_result (ScanResult): The ScanResult object to retrieve results.
         db_cols (list): List of database columns.
-        process_func (callable, optional): Custom processing function for the scan results.
-        **kwargs: Additional arguments for the processing function.
+        chunk_rows (int): Number of finding rows written per chunk.
+        incremental (bool): Diff against stored findings instead of upserting every row.
 
     Returns:
-        list: Upserted records.
+        dict: Counts of inserted/updated/unchanged/deleted rows, or None if the report does not exist.
     """
-    report = scan_result.get_scan_result(scan_type)
-    if report == None:
+    key, extend, score = STREAM_IMPORTS[scan_type]
+    entries = scan_result.iter_scan_result(scan_type, key)
+    if entries is None:
         return None
+
+    record_type = scan_type.upper()
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "total": 0}
+    # Scored types get their CVSS columns from the scoring engine, the others from the report
+    new_columns = lambda: FindingColumns(extra_columns=() if score else ("cvss_strings", "risk_score"))
+    columns = new_columns()
+    scores = {}
+
+    async def flush(columns: FindingColumns):
+        # Keep the first occurrence of a finding, within the chunk and across chunks
+        df = columns.to_frame(dedup_subset=["id", "resource_name"])
+        keys = list(zip(df["id"], df["resource_name"]))
+        claimed = await claim_import_keys(record_type, keys)
+        df = df[[row_key in claimed for row_key in keys]].reset_index(drop=True)
+        if df.empty:
+            return
+        totals["total"] += len(df)
+        stored = {}
+        if incremental or reuse_scores:
+            stored = await fetch_records_by_keys(record_type, list(zip(df["id"], df["resource_name"])), db_cols)
+        if score:
+            if reuse_scores:
+                _seed_scores(stored.values(), scores)
+            df = await _score_chunk(df, scores)
+        df = df[db_cols]
+        if incremental:
+            records = df.to_dict(orient="records")
+            changed = [
+                r for r in records
+                if (r["id"], r["resource_name"]) not in stored
+                or finding_hash(stored[(r["id"], r["resource_name"])]) != finding_hash(r)
+            ]
+            totals["unchanged"] += len(records) - len(changed)
+            if not changed:
+                return
+            df = pd.DataFrame(changed, columns=db_cols)
+        stats = await bulk_upsert_records(df)
+        totals["inserted"] += stats["inserted"]
+        totals["updated"] += stats["updated"]
+
     try:
-        if process_func:
-            df = await process_func(report, **kwargs)
+        # Stored scores are only reused when they come from the current scoring prompts
+        version = scoring_version() if score else None
+        reuse_scores = score and await get_score_version(record_type) == version
+        await clear_import_keys(record_type)
+        for entry in entries:
+            extend(columns, entry)
+            if len(columns) >= chunk_rows:
+                await flush(columns)
+                columns = new_columns()
+        if len(columns):
+            await flush(columns)
+
+        if incremental:
+            totals["deleted"] = await delete_unclaimed_records(record_type)
         else:
-            print("generate db content===================")
-            df = await globals()[f"gen_{scan_type}_db_content"](report, db_cols)
-        rows = df.to_dict(orient="records")
-        return await batch_upsert_records(rows)
+            await clear_import_keys(record_type)
+        if score:
+            await set_score_version(record_type, version)
+
+        print(
+            f"{scan_type}: {totals['inserted']} new, {totals['updated']} changed, "
+            f"{totals['unchanged']} unchanged, {totals['deleted']} resolved"
+        )
+        return totals
     except Exception as e:
         print(e)
         return None
 
-async def initialize_database_and_scans():
-    """Initialize the database, process scan results, and export records to CSV."""
+async def prepare_import():
+    """Initialize the database and mark an import as in progress until finalize_import."""
     # Use the consistent absolute path
     await init_db(DEFAULT_DB_PATH)
-    
-    db_cols = ['type', 'id', 'resource_name', 'service_name', 'avdid', 'title', 'description', 'resolution', 'severity', 'message', 'cvss_strings', 'risk_score', 'cause_metadata']
+    await begin_import(DEFAULT_DB_PATH)
+
+async def finalize_import(pregenerate: bool = REPORT_PREGENERATE):
+    """Rebuild the materialized report tables, refresh planner statistics and publish the new data generation."""
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, refresh_report_tables, DEFAULT_DB_PATH)
+    await analyze_db(DEFAULT_DB_PATH)
+    # Bumped last, so readers never see a generation for a half-finished import
+    generation = await bump_data_generation(DEFAULT_DB_PATH)
+    if pregenerate and generation is not None:
+        # The import returns now; the reports are generated while the caller goes on
+        task = asyncio.create_task(pregenerate_reports(generation))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+async def wait_background_tasks():
+    """Wait for the reports scheduled by finalize_import, before a command line run exits."""
+    if _background_tasks:
+        print(f"Waiting for {len(_background_tasks)} background report generation task(s)")
+        await asyncio.gather(*list(_background_tasks), return_exceptions=True)
+
+async def pregenerate_reports(generation: int, db_path: str = DEFAULT_DB_PATH):
+    """
+    Generate the executive report of every category concurrently and store them for the given
+    data generation, so /report requests are answered without any LLM call.
+
+    :param generation: The scan data generation the reports are generated from.
+    :param db_path: Path of the results database.
+    """
+    model = load_chat_model()
+    cache = ReportCache(database_path=db_path)
+    version = report_version()
+
+    async def build(category: str):
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            content = await generate_report(conn, category, model)
+            await asyncio.to_thread(cache.put, category, generation, version, content)
+            print(f"Pre-generated {category} report for data generation {generation}")
+        except Exception as e:
+            print(f"Error pre-generating {category} report: {e}")
+        finally:
+            conn.close()
+
+    await asyncio.gather(*(build(category.lower()) for category in REPORT_CATEGORIES))
+
+async def import_scan_type(scan_type: str, scan_result: ScanResult = None):
+    """
+    Import the report of a single scan type into the database.
+
+    Args:
+        scan_type (str): The type of scan (e.g., "kubernetes", "aws", "code", "container").
+        scan_result (ScanResult, optional): The ScanResult object to retrieve results.
+
+    Returns:
+        dict: Inserted/updated counts, or None if the report does not exist or the import failed.
+    """
+    return await stream_and_upsert_scan_results(scan_type, scan_result or ScanResult(), DB_COLS)
+
+async def initialize_database_and_scans():
+    """Initialize the database, process scan results, and export records to CSV."""
+    await prepare_import()
     scan_result = ScanResult()
 
-    # Process different scan types
-    await process_and_upsert_scan_results("kubernetes", scan_result, db_cols)
-    await process_and_upsert_scan_results("aws", scan_result, db_cols)
-    await process_and_upsert_scan_results("code", scan_result, db_cols, process_func=process_code_scan, type="CODE")
-    await process_and_upsert_scan_results("container", scan_result, db_cols, process_func=process_code_scan, type="CONTAINER")
+    # Stream each report into the database chunk by chunk
+    for scan_type in ["kubernetes", "aws", "code", "container"]:
+        await import_scan_type(scan_type, scan_result)
+    await finalize_import()
+    await wait_background_tasks()
 
 if __name__ == '__main__':
     asyncio.run(initialize_database_and_scans())
@@ -1,7 +1,16 @@
 import argparse
+import asyncio
+import os
+import sys
+import time
 from scan_result import ScanResult,  get_scan_config
+from src.scan.k8s_shards import ShardScanError
+from src.scan.monorepo import MonorepoScanError
 
 SR = ScanResult()
+SCAN_TYPES = ["code", "container", "kubernetes", "aws"]
+SCAN_MAX_PARALLEL = int(os.environ.get("SCAN_MAX_PARALLEL", "4"))
+
 def arg_parse():
     parser = argparse.ArgumentParser(description="Scan all resource from scan config yaml")
     parser.add_argument(
@@ -10,13 +19,134 @@ def arg_parse():
         default="/tmp/tmcybertron/agent.yaml",
         help="Path to the scan configuration file."
     )
+    parser.add_argument(
+        "--type",
+        choices=SCAN_TYPES,
+        help="Only scan this resource type."
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        nargs="?",
+        const=SCAN_MAX_PARALLEL,
+        default=0,
+        help=f"Run the configured scans concurrently with at most N scans at once (default N: {SCAN_MAX_PARALLEL})."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rescan even if a stored report was produced from an unchanged target (see SCAN_CACHE_TTL)."
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="For a sharded kubernetes scan, only rescan the shards that failed in the last run."
+    )
+    parser.add_argument(
+        "--import",
+        dest="run_import",
+        action="store_true",
+        help="In parallel mode, import each scan into the database as soon as its report lands."
+    )
 
     args = parser.parse_args()
     return args
 
+async def run_scan_process(scan_type: str, config_path: str, semaphore: asyncio.Semaphore, force: bool = False, retry_failed: bool = False) -> int:
+    """
+    Run a single scan type in a child process and stream its output prefixed with the scan type.
+
+    :param scan_type: The type of resource to scan.
+    :param config_path: Path to the scan configuration file.
+    :param semaphore: Semaphore bounding the number of concurrent scans.
+    :param force: Rescan even if the stored report is up to date.
+    :param retry_failed: Only rescan the failed shards of a sharded kubernetes scan.
+    :return: The exit code of the scan process.
+    """
+    async with semaphore:
+        start = time.monotonic()
+        print(f"[{scan_type}] scan started", flush=True)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__),
+            "--scan-config-path", config_path,
+            "--type", scan_type,
+            *(["--force"] if force else []),
+            *(["--retry-failed"] if retry_failed else []),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"},
+            limit=1 << 20,
+        )
+        async for line in process.stdout:
+            print(f"[{scan_type}] {line.decode(errors='replace').rstrip()}", flush=True)
+        code = await process.wait()
+        print(f"[{scan_type}] scan finished with exit code {code} in {time.monotonic() - start:.1f}s", flush=True)
+        return code
+
+async def orchestrate(config_path: str, max_parallel: int, run_import: bool, force: bool = False, retry_failed: bool = False) -> int:
+    """
+    Launch the configured scans concurrently and optionally import each report as soon as it lands.
+
+    :param config_path: Path to the scan configuration file.
+    :param max_parallel: Maximum number of concurrent scans.
+    :param run_import: Import each finished scan into the database.
+    :param force: Rescan even if the stored reports are up to date.
+    :param retry_failed: Only rescan the failed shards of a sharded kubernetes scan.
+    :return: 0 if every scan (and import) succeeded, 1 otherwise.
+    """
+    scan_config = get_scan_config(config_path)
+    scan_types = [scan_type for scan_type, value in scan_config.items() if scan_type in SCAN_TYPES and value]
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+    # Imports share one SQLite file, so they run one at a time while other scans continue
+    import_lock = asyncio.Lock()
+
+    if run_import:
+        from src.scan.scan_import import prepare_import, import_scan_type, finalize_import, wait_background_tasks
+        await prepare_import()
+
+    async def scan_and_import(scan_type: str):
+        code = await run_scan_process(scan_type, config_path, semaphore, force, retry_failed)
+        if code != 0 or not run_import:
+            return scan_type, code, None
+        async with import_lock:
+            start = time.monotonic()
+            print(f"[{scan_type}] import started", flush=True)
+            stats = await import_scan_type(scan_type)
+            print(f"[{scan_type}] import finished in {time.monotonic() - start:.1f}s: {stats}", flush=True)
+        return scan_type, code, stats
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(scan_and_import(scan_type) for scan_type in scan_types))
+    if run_import:
+        await finalize_import()
+
+    print(f"========================== Scan Summary ({time.monotonic() - start:.1f}s) ==========================")
+    failed = False
+    for scan_type, code, stats in results:
+        import_failed = run_import and code == 0 and stats is None
+        failed = failed or code != 0 or import_failed
+        status = "import failed" if import_failed else ("ok" if code == 0 else "failed")
+        print(f"{scan_type}: exit code {code}, {status}")
+    if run_import:
+        await wait_background_tasks()
+    return 1 if failed else 0
+
 if __name__ == "__main__":
     args = arg_parse()
+    if args.parallel and not args.type:
+        sys.exit(asyncio.run(orchestrate(args.scan_config_path, args.parallel, args.run_import, args.force, args.retry_failed)))
+
     scan_config = get_scan_config(args.scan_config_path)
+    failed = []
     for scan_type, _ in scan_config.items():
-        SR.scan(resource_type=scan_type, config_path=args.scan_config_path)
-
+        if args.type and scan_type != args.type:
+            continue
+        # A failed scan type does not stop the others, the run exits non-zero at the end
+        try:
+            SR.scan(resource_type=scan_type, config_path=args.scan_config_path, force=args.force, retry_failed=args.retry_failed)
+        except (MonorepoScanError, ShardScanError) as e:
+            print(f"[{scan_type}] {e}")
+            failed.append(scan_type)
+    if failed:
+        print(f"Failed scans: {', '.join(failed)}")
+        sys.exit(1)
@@ -3,8 +3,14 @@ import json
 from typing import Optional
 from src.scan.kubernetes import scan_kubernetes, k8s_resource_misconfigure
 from src.scan.filesystem import scan_filesystem
+from src.scan.monorepo import scan_monorepo
 from src.scan.image import scan_image
 from src.scan.aws import scan_aws
+from src.scan.report_stream import iter_report_entries
+from src.scan.report_index import load_report_index
+from src.scan.scan_cache import ScanCache, target_fingerprint
+from src.scan.k8s_shards import scan_kubernetes_sharded, iter_shard_entries, merge_shard_reports, ShardScanError, SHARD_PREFIX
+from src.scan.util import JSONParseError
 import yaml
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
@@ -31,13 +37,15 @@ def get_scan_config(config_path):
         return yaml.safe_load(file)
 
 class ScanResult:
-    def __init__(self, base_dir: str = "/tmp/tmcybertron/results"):
+    def __init__(self, base_dir: str = "/tmp/tmcybertron/results", cache: Optional[ScanCache] = None):
         """
         Initialize the base directory to store scan results categorized by resource type.
 
         :param base_dir: The base directory where results will be stored.
+        :param cache: Decides when a stored report can be reused instead of rescanning.
         """
         self.base_dir = base_dir
+        self.cache = cache or ScanCache()
         os.makedirs(self.base_dir, exist_ok=True)
 
     def _get_file_path(self, resource_type: str, resource_name: str) -> str:
@@ -85,47 +93,183 @@ class ScanResult:
         :param component_name: Optional name of a component within the resource.
         :return: The scan result or None if not found.
         """
+        if resource_type == "kubernetes" and resource_name == "default" and os.path.exists(self._shard_manifest_path()):
+            data = merge_shard_reports(self._shard_manifest_path(), self._shard_report_path)
+            if component_name:
+                return k8s_resource_misconfigure(data, component_name)
+            return data
+
         file_path = self._get_file_path(resource_type, resource_name)
         if not os.path.exists(file_path):
             return None
 
-        with open(file_path, 'r') as f:
-            try:
-                data = json.load(f)
-            except json.decoder.JSONDecodeError:
-                raise ReportFormatException()
-            if component_name and resource_type == "kubernetes":
-                return k8s_resource_misconfigure(data, component_name)
-            return data
-        return None
+        try:
+            # Parsed and indexed once per report file version
+            index = load_report_index(file_path)
+        except JSONParseError:
+            raise ReportFormatException()
+        if component_name and resource_type == "kubernetes":
+            return k8s_resource_misconfigure(index, component_name)
+        return index.report
+
+    def get_report_path(self, resource_type: str, resource_name: str = "default") -> Optional[str]:
+        """
+        Get the path of the stored report for a given resource type and name.
+
+        :param resource_type: The type of resource (e.g., 'code', 'container', 'kubernetes', 'aws').
+        :param resource_name: The name of the resource.
+        :return: The report path or None if not found.
+        """
+        file_path = self._get_file_path(resource_type, resource_name)
+        if not os.path.exists(file_path):
+            return None
+        return file_path
+
+    def _shard_report_path(self, shard_name: str) -> str:
+        return self._get_file_path("kubernetes", SHARD_PREFIX + shard_name)
+
+    def _shard_manifest_path(self) -> str:
+        return self._get_file_path("kubernetes", "shards")
+
+    def _remove_report(self, file_path: str):
+        self.cache.invalidate(file_path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    def _remove_shards(self):
+        manifest = self._shard_manifest_path()
+        if not os.path.exists(manifest):
+            return
+        with open(manifest, "r") as f:
+            shards = json.load(f).get("shards", [])
+        for shard in shards:
+            self._remove_report(self._shard_report_path(shard["name"]))
+        self._remove_report(manifest)
 
-    def scan(self, resource_type: str, config_path: Optional[str] = "/tmp/tmcybertron/agent.yaml", bg: bool = False):
+    def iter_scan_result(self, resource_type: str, key: str, resource_name: str = "default"):
+        """
+        Stream the entries of a top-level array of the stored report one at a time.
+
+        :param resource_type: The type of resource (e.g., 'code', 'container', 'kubernetes', 'aws').
+        :param key: The top-level array to stream ('Resources' or 'Results').
+        :param resource_name: The name of the resource.
+        :return: An iterator of entries, or None if the report is not found.
+        """
+        if resource_type == "kubernetes" and resource_name == "default" and os.path.exists(self._shard_manifest_path()):
+            # A sharded scan: merge the shard reports as they are streamed
+            return iter_shard_entries(self._shard_manifest_path(), self._shard_report_path, key)
+        file_path = self.get_report_path(resource_type, resource_name)
+        if file_path is None:
+            return None
+        return iter_report_entries(file_path, key)
+
+    def scan(self, resource_type: str, config_path: Optional[str] = "/tmp/tmcybertron/agent.yaml", bg: bool = False, force: bool = False, retry_failed: bool = False):
+        """
+        Scan a resource type of the scan config, unless the stored report was produced from
+        an unchanged target within the cache TTL.
+
+        :param resource_type: The type of resource (e.g., 'code', 'container', 'kubernetes', 'aws').
+        :param config_path: Path to the scan configuration file.
+        :param bg: Run the scan in the background. Background scans are not recorded in the cache.
+        :param force: Rescan even if the stored report is up to date.
+        :param retry_failed: For a sharded kubernetes scan, only rescan the shards that failed.
+        :return: True if the stored report was reused, False otherwise.
+        """
         scan_config = get_scan_config(config_path)
-        if resource_type == "code" and scan_config["code"]:
+        if resource_type not in scan_config or not scan_config[resource_type]:
+            return False
+        if resource_type == "kubernetes" and scan_config["kubernetes"].get("sharded"):
+            return self.scan_kubernetes_sharded(scan_config["kubernetes"], force, retry_failed)
+        report = self._get_file_path(resource_type, "default")
+        fingerprint = target_fingerprint(resource_type, scan_config[resource_type])
+        if not force and self.cache.lookup(report, fingerprint):
+            print(f'========================== Reuse {resource_type} report, target unchanged ({report}) ==========================')
+            return True
+        # The report is replaced below, a failed scan must not leave it marked up to date
+        self.cache.invalidate(report)
+
+        if resource_type == "code" and scan_config["code"].get("monorepo"):
+            print (f'========================== Start Scan Monorepo Code Path ({scan_config["code"]["folder"]})  ==========================')
+            result = scan_monorepo(
+                folder=scan_config["code"]["folder"],
+                report=report,
+                **{key: scan_config["code"][key] for key in ("workers",) if key in scan_config["code"]}
+            )
+        elif resource_type == "code":
             print (f'========================== Start Scan Code Path ({scan_config["code"]["folder"]})  ==========================')
-            scan_filesystem(
+            result = scan_filesystem(
                 path=scan_config["code"]["folder"],
-                report=self._get_file_path(resource_type, "default"),
-                bg=bg
+                report=report,
+                bg=bg,
+                load_report=False
             )
-        elif resource_type == "container" and scan_config["container"]:
+        elif resource_type == "container":
             print (f'========================== Start Scan Image({scan_config["container"]["image_path"]}) ==========================')
-            scan_image(
+            result = scan_image(
                 image_path=scan_config["container"]["image_path"],
-                report=self._get_file_path(resource_type, "default"),
-                bg=bg
+                report=report,
+                bg=bg,
+                load_report=False
             )
-        elif resource_type == "kubernetes" and scan_config["kubernetes"]:
+        elif resource_type == "kubernetes":
             print (f'========================== Start Scan Kubernetes ({scan_config["kubernetes"]["config_path"]}) ==========================')
-            scan_kubernetes(
-                report=self._get_file_path(resource_type, "default"),
+            # The whole cluster report replaces the shards of a previous sharded scan
+            self._remove_shards()
+            result = scan_kubernetes(
+                report=report,
                 config_path=scan_config["kubernetes"]["config_path"],
-                bg=bg
+                bg=bg,
+                load_report=False
             )
-        elif resource_type == "aws" and scan_config["aws"]:
+        elif resource_type == "aws":
             print (f'========================== Start Scan AWS ({scan_config["aws"]["region"]}) ==========================')
-            scan_aws(
-                report=self._get_file_path(resource_type, "default"),
+            result = scan_aws(
+                report=report,
                 region=scan_config["aws"]["region"],
-                bg=bg
+                bg=bg,
+                load_report=False
             )
+        else:
+            return False
+
+        if result and not bg:
+            self.cache.store(report, fingerprint)
+        return False
+
+    def scan_kubernetes_sharded(self, config: dict, force: bool = False, retry_failed: bool = False) -> bool:
+        """
+        Scan the cluster one namespace shard at a time, writing one report per shard under the
+        kubernetes directory. Enabled by `sharded: true` in the kubernetes scan config;
+        `namespaces_per_shard` and `workers` override K8S_NAMESPACES_PER_SHARD and
+        K8S_SHARD_WORKERS.
+
+        :param config: The kubernetes section of the scan config.
+        :param force: Rescan even if the shard reports are up to date.
+        :param retry_failed: Only rescan the shards that failed in the last run.
+        :return: True if the shard reports were reused, False otherwise.
+        :raises ShardScanError: If shards failed; their last good reports are kept.
+        """
+        manifest_path = self._shard_manifest_path()
+        fingerprint = target_fingerprint("kubernetes", config)
+        if not force and not retry_failed and self.cache.lookup(manifest_path, fingerprint):
+            print(f'========================== Reuse kubernetes shard reports, target unchanged ({manifest_path}) ==========================')
+            return True
+        print(f'========================== Start Sharded Scan Kubernetes ({config["config_path"]}) ==========================')
+        if not os.path.exists(config["config_path"]):
+            print(f"Error: The folder '{config['config_path']}' does not exist.")
+            return False
+        self.cache.invalidate(manifest_path)
+        # The shards replace the whole cluster report of a previous scan
+        self._remove_report(self._get_file_path("kubernetes", "default"))
+
+        kwargs = {key: config[key] for key in ("workers",) if key in config}
+        if "namespaces_per_shard" in config:
+            kwargs["per_shard"] = config["namespaces_per_shard"]
+        manifest = scan_kubernetes_sharded(
+            config["config_path"], self._shard_report_path, manifest_path, retry_failed=retry_failed, **kwargs
+        )
+        failed = manifest.failed()
+        if failed:
+            raise ShardScanError([shard["name"] for shard in failed])
+        self.cache.store(manifest_path, fingerprint)
+        return False
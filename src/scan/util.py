@@ -3,12 +3,13 @@ import os
 import sys
 import io
 import json
-import tiktoken
 import json
 import pandas as pd
 from prettytable import PrettyTable
 from importlib import resources
 
+from src.utils.tokens import count_tokens
+
 # Filter rows based on severity
 def filter_severity(df, severity_levels, min_count=5):
     filtered_df = df[df["Severity"].isin(severity_levels)]
@@ -20,14 +21,7 @@ def sanitize_input(input_text: str) -> str:
 
 
 def count_gpt_tokens(text, model_name="gpt-4o"):
-    # Initialize the encoder for the specified model
-    encoder = tiktoken.encoding_for_model(model_name)
-
-    # Encode the text into tokens
-    tokens = encoder.encode(text)
-
-    # Return the number of tokens
-    return len(tokens)
+    return count_tokens(text, model_name=model_name)
 
 class NoOutputError(Exception):
     """Exception raised when the expected output file is not found."""
@@ -36,9 +30,27 @@ class NoOutputError(Exception):
         self.message = f"Output file '{filename}' not found. Command may have failed to create it."
         super().__init__(self.message)
 
-def run_command_and_read_output(command: list, output_file: str) -> dict:
+class JSONParseError(Exception):
+    """Exception raised when the output file is not valid JSON."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.message = f"Output file '{filename}' is not a valid JSON report."
+        super().__init__(self.message)
+
+def run_command_and_read_output(command: list, output_file: str, load: bool = True):
+    """
+    Run a scan command and read the JSON report it writes.
+
+    :param command: The command to run.
+    :param output_file: The report file the command writes.
+    :param load: Parse the report into memory. When False only the report path is returned,
+                 so multi-GB reports can be streamed later instead of loaded here.
+    :return: The parsed report, or the report path when load is False.
+    """
     subprocess.run(command, check=True)
     if os.path.exists(output_file):
+        if not load:
+            return output_file
         with open(output_file, "r") as file:
             try:
                 return json.load(file)
@@ -48,6 +60,21 @@ def run_command_and_read_output(command: list, output_file: str) -> dict:
         raise NoOutputError(output_file)
 
 
+def update_trivy_db(java_db: bool = False):
+    """Download the vulnerability DBs once, before scans that run with concurrent=True."""
+    subprocess.run([
+        "trivy", "fs",
+        "--download-db-only",
+        "--db-repository", "public.ecr.aws/aquasecurity/trivy-db",
+    ], check=True)
+    if java_db:
+        subprocess.run([
+            "trivy", "fs",
+            "--download-java-db-only",
+            "--java-db-repository", "public.ecr.aws/aquasecurity/trivy-java-db",
+        ], check=True)
+
+
 def extract_code_to_buffer(file_path, start_line, end_line):
     """
     Extracts lines from start_line to end_line (inclusive) from the file at file_path
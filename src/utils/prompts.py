@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from langchain.prompts import PromptTemplate
+
+PROMPTS_DIR = "./src/prompts"
+# Re-read prompt files when they change on disk, for prompt development
+PROMPT_RELOAD = os.environ.get("PROMPT_RELOAD", "0") == "1"
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    path: str
+    text: str
+    template: PromptTemplate
+    hash: str
+    mtime: float
+
+    def format(self, **input_vars) -> str:
+        return self.template.format(**input_vars)
+
+def _load_prompt(path: Path) -> Prompt:
+    text = path.read_text(encoding="utf-8")
+    return Prompt(
+        name=path.stem,
+        path=str(path),
+        text=text,
+        template=PromptTemplate.from_template(text),
+        hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        mtime=path.stat().st_mtime,
+    )
+
+class PromptRegistry:
+    """
+    Prompt files loaded once and pre-parsed into templates, looked up by file stem.
+
+    Each prompt carries a sha256 of its content, which caches depending on a prompt use as
+    their version key. With reload enabled, a prompt is re-read when its file mtime changes.
+    """
+
+    def __init__(self, prompts_dir: str = PROMPTS_DIR, reload: bool = PROMPT_RELOAD):
+        self.prompts_dir = Path(prompts_dir)
+        self.reload = reload
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, Prompt] = {}
+        for path in sorted(self.prompts_dir.glob("*.txt")):
+            try:
+                self._prompts[path.stem] = _load_prompt(path)
+            except (OSError, ValueError) as e:
+                print(f"Error loading prompt {path}: {e}")
+
+    @staticmethod
+    def name_for(path_or_name: str) -> str:
+        """Accept a prompt name, file name or path (e.g. ./src/prompts/summary_prompt.txt)."""
+        return Path(path_or_name).stem
+
+    def get(self, path_or_name: str) -> Optional[Prompt]:
+        name = self.name_for(path_or_name)
+        prompt = self._prompts.get(name)
+        if prompt is None or self.reload:
+            prompt = self._refresh(name, prompt)
+        return prompt
+
+    def _refresh(self, name: str, prompt: Optional[Prompt]) -> Optional[Prompt]:
+        path = self.prompts_dir / f"{name}.txt" if prompt is None else Path(prompt.path)
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            if prompt is None:
+                print(f"Error reading prompt {name}: no such file {path}")
+            return prompt
+        if prompt is not None and prompt.mtime == mtime:
+            return prompt
+        try:
+            loaded = _load_prompt(path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading prompt {path}: {e}")
+            return prompt
+        with self._lock:
+            self._prompts[name] = loaded
+        return loaded
+
+    def text(self, path_or_name: str) -> str:
+        prompt = self.get(path_or_name)
+        return prompt.text if prompt else ""
+
+    def format(self, path_or_name: str, **input_vars) -> str:
+        prompt = self.get(path_or_name)
+        return prompt.format(**input_vars) if prompt else ""
+
+    def version(self, *paths_or_names: str) -> str:
+        """Combined content hash of one or more prompts."""
+        digest = hashlib.sha256()
+        for path_or_name in paths_or_names:
+            prompt = self.get(path_or_name)
+            digest.update((prompt.hash if prompt else "").encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+prompt_registry = PromptRegistry()
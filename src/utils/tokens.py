@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import tiktoken
+
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "4096"))
+
+@lru_cache(maxsize=None)
+def get_encoder(model_name: str = "gpt-4o") -> tiktoken.Encoding:
+    """Process wide tiktoken encoder per model; unknown models fall back to o200k_base."""
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+class TokenCountCache:
+    """
+    LRU bounded token counts keyed by encoding and content digest.
+
+    Chat history is recounted on every turn; memoizing per message content means each message
+    is encoded once per encoding for the lifetime of the process.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str, model_name: str) -> int:
+        if not text:
+            return 0
+        encoder = get_encoder(model_name)
+        key = (encoder.name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        count = len(encoder.encode(text, disallowed_special=()))
+        with self._lock:
+            self._counts[key] = count
+            if len(self._counts) > self.max_size:
+                self._counts.popitem(last=False)
+        return count
+
+token_cache = TokenCountCache()
+
+def count_tokens(text: str, model_name: str = "gpt-4o") -> int:
+    return token_cache.count(text, model_name)
+
+def message_token_count(message, model_name: str = "gpt-4-turbo") -> int:
+    content = message.content if message.content else ""
+    if not isinstance(content, str):
+        content = str(content)
+    return token_cache.count(content, model_name)
+
+def messages_token_count(messages, model_name: str = "gpt-4-turbo") -> int:
+    return sum(message_token_count(message, model_name) for message in messages)
+
+def trim_messages(messages, max_tokens: int, model_name: str = "gpt-4-turbo") -> list:
+    """
+    Drop the oldest messages until the total token count is at most max_tokens.
+
+    Every message is counted once and the cut point is found in a single pass over the
+    running total, always keeping at least the latest message.
+
+    Args:
+        messages (list): Message objects, oldest first.
+        max_tokens (int): Token budget for the returned messages.
+        model_name (str): Model name used to select the encoding.
+
+    Returns:
+        list: The newest messages that fit the budget.
+    """
+    counts = [message_token_count(message, model_name) for message in messages]
+    total = sum(counts)
+    start = 0
+    while total > max_tokens and start < len(counts) - 1:
+        total -= counts[start]
+        start += 1
+    return list(messages[start:])
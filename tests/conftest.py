@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# src modules load the chat model and open the results database on import
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DEFAULT_DB_PATH", os.path.join(tempfile.mkdtemp(), "results.db"))
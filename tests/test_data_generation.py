@@ -0,0 +1,24 @@
+import asyncio
+
+from src.db.db_setup import AppContext
+from src.db.config import RESULTS_TABLE_SCHEMA
+from src.db.db_util import apply_migrations_sync, begin_import, bump_data_generation, _init_db_sync
+
+def test_results_are_not_cached_while_an_import_runs(tmp_path):
+    db_path = str(tmp_path / "results.db")
+    _init_db_sync(db_path, RESULTS_TABLE_SCHEMA)
+    apply_migrations_sync(db_path)
+    context = AppContext()
+    context.db_path = db_path
+
+    generation = context.check_data_version()
+    assert context.data_settled(generation)
+
+    asyncio.run(begin_import(db_path))
+    # A read that started before the import is not cached either
+    assert not context.data_settled(generation)
+    assert context.check_data_version() == generation
+
+    asyncio.run(bump_data_generation(db_path))
+    assert not context.data_settled(generation)
+    assert context.data_settled(context.check_data_version())
@@ -0,0 +1,35 @@
+import json
+
+import src.scan.k8s_shards as k8s_shards
+
+NAMESPACES = ["default", "payments", "web"]
+
+def test_merged_shard_reports_have_no_duplicate_resources(tmp_path, monkeypatch):
+    calls = {}
+
+    def scan_kubernetes(report, include_namespaces, exclude_namespaces, exclude_kinds, **kwargs):
+        calls[tuple(include_namespaces)] = exclude_kinds
+        namespaced = [{"Namespace": ns, "Kind": "Deployment", "Name": "app", "Results": []} for ns in include_namespaces]
+        # As if the kind filter did not apply, every shard reports the cluster-scoped resources
+        cluster = [{"Namespace": "", "Kind": kind, "Name": "admin", "Results": []} for kind in ("ClusterRole", "Node")]
+        with open(report, "w") as file:
+            json.dump({"ClusterName": "test", "Resources": namespaced + cluster}, file)
+
+    monkeypatch.setattr(k8s_shards, "scan_kubernetes", scan_kubernetes)
+    monkeypatch.setattr(k8s_shards, "list_namespaces", lambda config_path: NAMESPACES)
+    monkeypatch.setattr(k8s_shards, "update_trivy_db", lambda: None)
+
+    report_path = lambda name: str(tmp_path / f"shard-{name}.json")
+    manifest_path = str(tmp_path / "manifest.json")
+    k8s_shards.scan_kubernetes_sharded("kubeconfig", report_path, manifest_path, workers=2)
+
+    # Only the cluster shard scans cluster-scoped kinds
+    assert calls[()] == []
+    for namespace in NAMESPACES:
+        assert "clusterrole" in calls[(namespace,)] and "node" in calls[(namespace,)]
+
+    entries = list(k8s_shards.iter_shard_entries(manifest_path, report_path, "Resources"))
+    merged = k8s_shards.merge_shard_reports(manifest_path, report_path)["Resources"]
+    for resources in (entries, merged):
+        keys = [(r["Namespace"], r["Kind"], r["Name"]) for r in resources]
+        assert len(keys) == len(set(keys)) == len(NAMESPACES) + 2
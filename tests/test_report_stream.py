@@ -0,0 +1,74 @@
+import asyncio
+from typing import TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langgraph.graph import StateGraph, START, END
+
+from src.core.app import ordered_stream_events, STREAM_STOP
+
+def collect(stream) -> list:
+    async def run():
+        return [(node, "STOP" if event is STREAM_STOP else event) async for node, event in ordered_stream_events(stream)]
+    return asyncio.run(run())
+
+async def chunks(items):
+    for item in items:
+        yield item
+
+def token(node: str, content: str, **metadata):
+    return "messages", (AIMessageChunk(content=content, response_metadata=metadata), {"langgraph_node": node})
+
+@pytest.mark.parametrize("summary_end", [{}, {"finish_reason": "length"}])
+def test_insight_waits_for_summary_update_not_finish_reason(summary_end):
+    stream = chunks([
+        token("summary", "S1"),
+        token("insight", "I1"),
+        token("summary", "S2", **summary_end),
+        token("insight", "I2", finish_reason="stop"),
+        ("updates", {"insight": {}}),
+        ("updates", {"summary": {}}),
+        token("conclude", "C1"),
+        ("updates", {"conclude": {}}),
+    ])
+    assert collect(stream) == [
+        ("summary", "S1"), ("summary", "S2"), ("summary", "STOP"),
+        ("insight", "I1"), ("insight", "I2"), ("insight", "STOP"),
+        ("conclude", "C1"), ("conclude", "STOP"),
+    ]
+
+def test_report_graph_without_finish_reason():
+    class State(TypedDict, total=False):
+        messages: list
+        summary_message: object
+        insight_message: object
+
+    # GenericFakeChatModel streams word by word and sends no finish_reason
+    def model(text: str):
+        return GenericFakeChatModel(messages=iter([AIMessage(content=text)]))
+
+    async def summary(state):
+        return {"summary_message": await model("summary text").ainvoke("")}
+
+    async def insight(state):
+        return {"insight_message": await model("insight text").ainvoke("")}
+
+    async def conclude(state):
+        return {"messages": [await model("conclusion").ainvoke("")]}
+
+    builder = StateGraph(State)
+    builder.add_node("summary", summary)
+    builder.add_node("insight", insight)
+    builder.add_node("conclude", conclude)
+    builder.add_edge(START, "summary")
+    builder.add_edge(START, "insight")
+    builder.add_edge(["summary", "insight"], "conclude")
+    builder.add_edge("conclude", END)
+    graph = builder.compile()
+
+    events = collect(graph.astream({"messages": [HumanMessage(content="/report all")]}, stream_mode=["messages", "updates"]))
+    order = [node for node, _ in events]
+    assert order == sorted(order, key=["summary", "insight", "conclude"].index)
+    assert "".join(event for node, event in events if node == "insight" and event != "STOP") == "insight text"
+    assert events.count(("insight", "STOP")) == 1
@@ -0,0 +1,53 @@
+import asyncio
+
+import src.scan.cvss_score as cvss_score
+import src.scan.scan_import as scan_import
+from src.db.config import DEFAULT_DB_PATH
+
+VECTOR = "CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N"
+
+class ReportResult:
+    def __init__(self, resources):
+        self.resources = resources
+
+    def iter_scan_result(self, scan_type, key):
+        return iter(self.resources)
+
+def resource(name: str, title: str) -> dict:
+    misconfiguration = {
+        "ID": "KSV001", "AVDID": "AVD-KSV-0001", "Title": title, "Description": "description",
+        "Resolution": "resolution", "Severity": "HIGH", "Message": f"message {name}",
+    }
+    return {
+        "Kind": "Deployment", "Name": name, "Namespace": "default",
+        "Results": [{"MisconfSummary": {"Failures": 1}, "Misconfigurations": [misconfiguration]}],
+    }
+
+def test_reimport_without_cvss_cache_does_not_rescore(monkeypatch):
+    calls = []
+
+    async def generate(self, rows):
+        calls.append(len(rows))
+        return [VECTOR] * len(rows)
+
+    monkeypatch.setattr(cvss_score, "CVSS_CACHE_ENABLED", False)
+    monkeypatch.setattr(cvss_score.CVSSScoringEngine, "generate", generate)
+
+    async def run():
+        await scan_import.init_db(DEFAULT_DB_PATH)
+        report = ReportResult([resource("api", "Privileged"), resource("web", "Privileged")])
+        first = await scan_import.stream_and_upsert_scan_results("kubernetes", report, scan_import.DB_COLS)
+        assert first["inserted"] == 2
+        assert calls == [1]
+
+        second = await scan_import.stream_and_upsert_scan_results("kubernetes", report, scan_import.DB_COLS)
+        assert second["unchanged"] == 2
+        assert calls == [1]
+
+        # Only the finding whose content changed is scored again
+        changed = ReportResult([resource("api", "Privileged"), resource("web", "Host network")])
+        third = await scan_import.stream_and_upsert_scan_results("kubernetes", changed, scan_import.DB_COLS)
+        assert third["updated"] == 1
+        assert calls == [1, 1]
+
+    asyncio.run(run())